@@ -13,7 +13,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
+from src.db import get_supabase_client
 
 def main():
     """Функция для добавления нового источника"""
@@ -26,7 +26,7 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         
         # Определяем новый источник
         new_source = {
@@ -41,8 +41,9 @@ def main():
         # Добавляем источник в базу данных
         result = db_client.client.table('sources').insert(new_source).execute()
         
-        if hasattr(result, 'error') and result.error:
-            logger.error(f"Ошибка добавления источника: {result.error}")
+        error = getattr(result, 'error', None)
+        if error:
+            logger.error(f"Ошибка добавления источника: {error}")
             return 1
         
         logger.success(f"Источник успешно добавлен: {new_source['name']}")
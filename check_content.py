@@ -9,15 +9,23 @@ import argparse
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import statistics
+from array import array
+from itertools import islice
 
 # Добавляем текущую директорию в путь для импортов
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
+from src.db import get_supabase_client
 from loguru import logger
 
+# Размер страницы при постраничной выборке статей
+PAGE_SIZE = 500
+
+# Колонки content_items, необходимые для проверки длины контента
+CHECK_COLUMNS = 'title, source, url, content'
+
 def parse_args():
     """Парсинг аргументов командной строки"""
     parser = argparse.ArgumentParser(description='Проверка длины контента сохраненных статей')
@@ -25,8 +33,11 @@ def parse_args():
                         help='Максимальное количество статей для проверки (по умолчанию: 10)')
     parser.add_argument('--min-length', type=int, default=500,
                         help='Минимальная ожидаемая длина контента (по умолчанию: 500)')
-    parser.add_argument('--source-id', type=str,
-                        help='ID конкретного источника для проверки')
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument('--source-id', type=str,
+                              help='ID конкретного источника для проверки')
+    source_group.add_argument('--source-name', type=str,
+                              help='Название источника для проверки (без дополнительного запроса к таблице sources)')
     parser.add_argument('--log-level', type=str, default='INFO', 
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         help='Уровень логирования (по умолчанию: INFO)')
@@ -47,43 +58,51 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
-        
-        # Формируем запрос
-        query = db_client.client.table('content_items').select('*')
+        db_client = get_supabase_client()
         
-        # Если указан source_id, фильтруем по нему
-        if args.source_id:
+        # Название источника фильтрует content_items напрямую,
+        # source_id требует предварительного запроса к таблице sources
+        source_name = args.source_name
+        if source_name:
+            logger.info(f"Проверка статей источника: {source_name}")
+        elif args.source_id:
             response = db_client.client.table('sources').select('name').eq('id', args.source_id).execute()
             if response.data:
                 source_name = response.data[0].get('name', 'Неизвестный источник')
                 logger.info(f"Проверка статей источника: {source_name} (ID: {args.source_id})")
-                query = query.eq('source', source_name)
             else:
                 logger.error(f"Источник с ID {args.source_id} не найден")
                 return 1
         
-        # Получаем статьи с ограничением по количеству
-        query = query.order('created_at', desc=True).limit(args.limit)
-        response = query.execute()
+        # Получаем статьи постранично, не дожидаясь загрузки всей выборки
+        page_size = max(1, min(args.limit, PAGE_SIZE))
+        # Запрашиваем только поля, нужные для анализа, без остальных колонок строки
+        articles = islice(
+            db_client.iter_content_items(columns=CHECK_COLUMNS, page_size=page_size, source=source_name),
+            args.limit
+        )
         
-        if not response.data:
-            logger.warning("Не найдено статей для проверки")
-            return 0
-            
-        # Анализируем длину контента
-        articles = response.data
-        content_lengths = []
+        # Анализируем длину контента: агрегаты считаются за один проход,
+        # длины хранятся в компактном массиве только для расчета медианы
+        content_lengths = array('l')
+        total_length = 0
+        min_length = None
+        max_length = 0
         short_content_count = 0
         
         for article in articles:
-            content = article.get('content', '')
+            content = article.get('content') or ''
             title = article.get('title', 'Без заголовка')
             source = article.get('source', 'Неизвестный источник')
             url = article.get('url', 'Без URL')
             
             content_length = len(content)
             content_lengths.append(content_length)
+            total_length += content_length
+            if min_length is None or content_length < min_length:
+                min_length = content_length
+            if content_length > max_length:
+                max_length = content_length
             
             if content_length < args.min_length:
                 logger.warning(f"Статья имеет короткий контент ({content_length} символов): {title} из {source}")
@@ -95,21 +114,22 @@ def main():
             else:
                 logger.info(f"Статья имеет достаточный контент ({content_length} символов): {title} из {source}")
         
+        if not content_lengths:
+            logger.warning("Не найдено статей для проверки")
+            return 0
+        
         # Выводим статистику
-        if content_lengths:
-            avg_length = sum(content_lengths) / len(content_lengths)
-            min_length = min(content_lengths)
-            max_length = max(content_lengths)
-            median_length = statistics.median(content_lengths)
-            
-            logger.success(
-                f"Статистика контента для {len(articles)} статей:\n"
-                f"Средняя длина: {avg_length:.2f} символов\n"
-                f"Минимальная длина: {min_length} символов\n"
-                f"Максимальная длина: {max_length} символов\n"
-                f"Медианная длина: {median_length} символов\n"
-                f"Статей с коротким контентом (<{args.min_length} символов): {short_content_count}"
-            )
+        avg_length = total_length / len(content_lengths)
+        median_length = statistics.median(content_lengths)
+        
+        logger.success(
+            f"Статистика контента для {len(content_lengths)} статей:\n"
+            f"Средняя длина: {avg_length:.2f} символов\n"
+            f"Минимальная длина: {min_length} символов\n"
+            f"Максимальная длина: {max_length} символов\n"
+            f"Медианная длина: {median_length} символов\n"
+            f"Статей с коротким контентом (<{args.min_length} символов): {short_content_count}"
+        )
         
     except Exception as e:
         logger.exception(f"Ошибка при проверке статей: {e}")
@@ -2,10 +2,13 @@
 # check_rss.py
 import requests
 import feedparser
+import json
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -46,10 +49,41 @@ SOURCES = [
     }
 ]
 
+# Количество параллельных проверок источников
+MAX_WORKERS = 16
+
+# Общая сессия, чтобы переиспользовать TCP/TLS соединения между запросами
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Файл с ETag/Last-Modified и последним результатом проверки каждой ленты
+FEED_CACHE_FILE = '.rss_check_cache.json'
+
+# Кэш условных запросов: {url: {"etag": ..., "modified": ..., "result": ...}}
+FEED_CACHE = {}
+
+def load_feed_cache():
+    """Загрузка кэша условных запросов с диска"""
+    try:
+        with open(FEED_CACHE_FILE, 'r', encoding='utf-8') as f:
+            FEED_CACHE.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_feed_cache():
+    """Сохранение кэша условных запросов на диск"""
+    try:
+        with open(FEED_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(FEED_CACHE, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Не удалось сохранить кэш RSS: {e}")
+
 def check_url(url):
     """Проверка доступности URL и заголовков ответа"""
     try:
-        response = requests.head(url, timeout=10)
+        response = SESSION.head(url, timeout=10, allow_redirects=True)
         return {
             "status": response.status_code,
             "content_type": response.headers.get("Content-Type", ""),
@@ -66,7 +100,21 @@ def check_url(url):
 def check_rss(url):
     """Проверка доступности RSS и парсинг содержимого"""
     try:
-        feed = feedparser.parse(url)
+        # Условный запрос: неизменившаяся лента вернет 304 без тела
+        cached = FEED_CACHE.get(url, {})
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('modified'):
+            headers['If-Modified-Since'] = cached['modified']
+        
+        # Загружаем ленту через общую сессию, чтобы переиспользовать соединение,
+        # открытое при проверке заголовков, и передаем feedparser готовые байты
+        response = SESSION.get(url, timeout=10, headers=headers)
+        if response.status_code == 304 and 'result' in cached:
+            return cached['result']
+        response.raise_for_status()
+        feed = feedparser.parse(response.content)
         
         # Проверяем наличие ошибок при парсинге
         if feed.bozo and feed.bozo_exception:
@@ -76,11 +124,19 @@ def check_rss(url):
                 "entries": 0
             }
         
-        return {
+        result = {
             "success": True,
             "entries": len(feed.entries),
             "feed_title": feed.feed.get("title", "Неизвестно") if hasattr(feed, 'feed') else "Нет данных"
         }
+        
+        # Запоминаем валидаторы ленты для следующего запуска
+        etag = response.headers.get('ETag')
+        modified = response.headers.get('Last-Modified')
+        if etag or modified:
+            FEED_CACHE[url] = {"etag": etag, "modified": modified, "result": result}
+        
+        return result
     except Exception as e:
         return {
             "success": False,
@@ -88,40 +144,67 @@ def check_rss(url):
             "entries": 0
         }
 
+def format_check(label, url):
+    """
+    Проверка одного RSS URL и форматирование результата
+    
+    Args:
+        label: Подпись URL в отчете
+        url: RSS URL для проверки
+        
+    Returns:
+        tuple: (список строк отчета, успешность парсинга RSS)
+    """
+    lines = [f"\n{label}: {url}"]
+    http_result = check_url(url)
+    lines.append(f"HTTP Статус: {http_result['status']}, Content-Type: {http_result['content_type']}")
+    
+    rss_result = check_rss(url)
+    if rss_result['success']:
+        lines.append(f"RSS статус: Успешно, Название ленты: {rss_result['feed_title']}, Статей: {rss_result['entries']}")
+    else:
+        lines.append(f"RSS статус: Ошибка, {rss_result['error']}")
+    
+    return lines, rss_result['success']
+
+def check_source(source):
+    """
+    Проверка RSS-лент одного источника
+    
+    Args:
+        source: Словарь с информацией об источнике
+        
+    Returns:
+        str: Готовый к выводу блок отчета по источнику
+    """
+    lines = [f"\nИсточник: {source['name']}", f"URL сайта: {source['url']}"]
+    
+    # Проверяем основной RSS URL
+    main_lines, success = format_check("Основной RSS URL", source['rss_url'])
+    lines.extend(main_lines)
+    
+    # Проверяем альтернативные RSS URL, если есть и если основной не работает
+    if not success and 'alt_rss_urls' in source:
+        lines.append("\nПроверка альтернативных RSS URL:")
+        for alt_url in source['alt_rss_urls']:
+            alt_lines, _ = format_check("Альтернативный RSS URL", alt_url)
+            lines.extend(alt_lines)
+    
+    lines.append("-" * 80)
+    return "\n".join(lines)
+
 def main():
     print("Проверка RSS-лент источников")
     print("-" * 80)
     
-    for source in SOURCES:
-        print(f"\nИсточник: {source['name']}")
-        print(f"URL сайта: {source['url']}")
-        
-        # Проверяем основной RSS URL
-        print(f"\nОсновной RSS URL: {source['rss_url']}")
-        http_result = check_url(source['rss_url'])
-        print(f"HTTP Статус: {http_result['status']}, Content-Type: {http_result['content_type']}")
-        
-        rss_result = check_rss(source['rss_url'])
-        if rss_result['success']:
-            print(f"RSS статус: Успешно, Название ленты: {rss_result['feed_title']}, Статей: {rss_result['entries']}")
-        else:
-            print(f"RSS статус: Ошибка, {rss_result['error']}")
-        
-        # Проверяем альтернативные RSS URL, если есть и если основной не работает
-        if not rss_result['success'] and 'alt_rss_urls' in source:
-            print("\nПроверка альтернативных RSS URL:")
-            for alt_url in source['alt_rss_urls']:
-                print(f"\nАльтернативный RSS URL: {alt_url}")
-                alt_http_result = check_url(alt_url)
-                print(f"HTTP Статус: {alt_http_result['status']}, Content-Type: {alt_http_result['content_type']}")
-                
-                alt_rss_result = check_rss(alt_url)
-                if alt_rss_result['success']:
-                    print(f"RSS статус: Успешно, Название ленты: {alt_rss_result['feed_title']}, Статей: {alt_rss_result['entries']}")
-                else:
-                    print(f"RSS статус: Ошибка, {alt_rss_result['error']}")
-        
-        print("-" * 80)
+    load_feed_cache()
+    
+    # Источники проверяются параллельно, отчеты выводятся в исходном порядке
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for report in executor.map(check_source, SOURCES):
+            print(report)
+    
+    save_feed_cache()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,7 @@
 # create_excel_example.py
 import os
-import pandas as pd
 import json
+from openpyxl import Workbook
 
 # Создаем директорию examples, если её нет
 os.makedirs('examples', exist_ok=True)
@@ -66,10 +66,15 @@ data = [
     }
 ]
 
-# Создаем DataFrame
-df = pd.DataFrame(data)
+# Заполняем лист напрямую через openpyxl: первая строка - заголовки колонок
+columns = list(data[0].keys())
+workbook = Workbook()
+sheet = workbook.active
+sheet.append(columns)
+for row in data:
+    sheet.append([row[column] for column in columns])
 
 # Сохраняем в Excel
-df.to_excel('examples/sources.xlsx', index=False)
+workbook.save('examples/sources.xlsx')
 
 print(f"Файл примера Excel создан: examples/sources.xlsx")
\ No newline at end of file
@@ -3,8 +3,13 @@
 import os
 import sys
 import argparse
+import heapq
 import time
-from datetime import datetime, timedelta
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -13,8 +18,24 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
-from update_content import fetch_full_content
+from src.db import get_supabase_client
+from src.utils.article_content import fetch_full_content, shutdown_parse_pool
+
+# Количество источников, обрабатываемых параллельно
+MAX_WORKERS = 16
+
+# Максимальное число источников одного хоста, обрабатываемых одновременно
+PER_HOST_LIMIT = 1
+
+# Количество параллельных загрузок полного контента в рамках одного источника
+CONTENT_WORKERS = 8
+
+# Дата для статей без даты публикации: такие статьи считаются самыми старыми
+MIN_DATE = datetime.min.replace(tzinfo=timezone.utc)
+
+# Семафоры по хостам: параллельно обрабатываются только источники с разных сайтов
+_host_semaphores = defaultdict(lambda: threading.Semaphore(PER_HOST_LIMIT))
+_host_semaphores_lock = threading.Lock()
 
 def parse_args():
     """Парсинг аргументов командной строки"""
@@ -67,36 +88,146 @@ def get_sources_to_update(db_client, force_all=False, source_id=None):
         # Или только те, которые нужно обновить (последнее обновление более 12 часов назад)
         cutoff_time = (datetime.now() - timedelta(hours=12)).isoformat()
         
-        # Получаем источники, которые никогда не обновлялись
-        null_response = db_client.client.table('sources').select('*')\
-            .eq('active', True)\
-            .is_('last_fetch_at', 'null')\
-            .execute()
-            
-        # Получаем источники, которые обновлялись давно
-        old_response = db_client.client.table('sources').select('*')\
+        # Получаем одним запросом источники, которые никогда не обновлялись
+        # или обновлялись давно (дата в кавычках, т.к. содержит точки и двоеточия)
+        response = db_client.client.table('sources').select('*')\
             .eq('active', True)\
-            .lt('last_fetch_at', cutoff_time)\
+            .or_(f'last_fetch_at.is.null,last_fetch_at.lt."{cutoff_time}"')\
             .execute()
         
-        # Объединяем результаты
-        sources = null_response.data + old_response.data
+        logger.info(f"Получено {len(response.data)} источников для обновления")
+        return response.data
+        
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка источников: {e}")
+        return []
+
+def get_host_semaphore(url):
+    """
+    Получение семафора для хоста источника
+    
+    Args:
+        url: URL источника
+        
+    Returns:
+        threading.Semaphore: Семафор, ограничивающий запросы к хосту
+    """
+    host = urlparse(url or '').netloc
+    with _host_semaphores_lock:
+        return _host_semaphores[host]
+
+def published_key(article):
+    """
+    Дата публикации статьи для сравнения и сортировки
+    
+    Args:
+        article: Данные статьи
+        
+    Returns:
+        datetime: Дата публикации в UTC или MIN_DATE, если дата неизвестна
+    """
+    return article.get('published_at') or MIN_DATE
+
+def process_source(source, args, db_client):
+    """
+    Загрузка статей одного источника
+    
+    Статьи не сохраняются здесь: все источники цикла сохраняются
+    в main() одним пакетным запросом.
+    
+    Args:
+        source: Данные источника
+        args: Аргументы командной строки
+        db_client: Клиент Supabase
+        
+    Returns:
+        dict: Результат обработки источника (articles, error, not_modified, feed_headers)
+    """
+    # Импортируем парсеры здесь, чтобы избежать циклических импортов
+    from src.parsers import get_parser_for_source
+    
+    source_result = {"articles": [], "error": False, "not_modified": False, "feed_headers": None}
+    source_name = source.get('name', 'Неизвестный источник')
+    logger.info(f"Обработка источника: {source_name}")
+    
+    try:
+        # Получаем подходящий парсер для источника
+        parser = get_parser_for_source(source)
+        
+        if not parser:
+            logger.error(f"Не удалось создать парсер для источника {source_name}")
+            source_result["error"] = True
+            return source_result
         
-        # Удаляем дубликаты, если есть
-        unique_sources = []
-        source_ids = set()
+        # Сетевые запросы к одному сайту выполняются последовательно
+        with get_host_semaphore(source.get('rss_url') or source.get('url')):
+            # Получаем статьи; RSS-парсер отправляет условный запрос по ETag/Last-Modified
+            articles = parser.fetch_articles()
+            
+            if getattr(parser, 'not_modified', False):
+                source_result["not_modified"] = True
+            elif getattr(parser, 'etag', None) or getattr(parser, 'last_modified', None):
+                source_result["feed_headers"] = {
+                    "etag": parser.etag,
+                    "last_modified": parser.last_modified
+                }
+            
+            # Фильтруем статьи по возрасту: дата каждой статьи вычисляется один раз
+            if args.age > 0 and articles:
+                cutoff_date = datetime.now(timezone.utc) - timedelta(days=args.age)
+                filtered_articles = [
+                    article for article in articles
+                    if published_key(article) >= cutoff_date
+                ]
+                
+                if len(filtered_articles) < len(articles):
+                    logger.info(f"Отфильтровано {len(articles) - len(filtered_articles)} устаревших статей")
+                    articles = filtered_articles
+            
+            # Применяем лимит, если указан: оставляем самые свежие статьи
+            if args.limit > 0 and len(articles) > args.limit:
+                logger.info(f"Применяем лимит в {args.limit} статей (всего найдено: {len(articles)})")
+                articles = heapq.nlargest(
+                    args.limit, articles,
+                    key=published_key
+                )
+            
+            logger.info(f"Получено {len(articles)} статей из {source_name}")
+            
+            # Для статей со слишком коротким контентом загружаем полный текст.
+            # Загрузки идут параллельно, их число ограничено CONTENT_WORKERS,
+            # а семафор хоста не пускает к сайту другие задачи цикла
+            if not args.dry_run and articles:
+                # Статьи, уже сохраненные в базе, будут пропущены при записи,
+                # поэтому их полный текст не загружаем; проверка одним запросом
+                known_urls = db_client.get_content_items_by_urls(
+                    [article.get('url') for article in articles], columns='url'
+                )
+                needs_content = [
+                    (i, article['url']) for i, article in enumerate(articles)
+                    if len(article.get('content') or '') < 500
+                    and article.get('url') and article['url'] not in known_urls
+                ]
+                
+                if needs_content:
+                    logger.info(f"Загрузка полного контента для {len(needs_content)} статей из {source_name}")
+                    with ThreadPoolExecutor(max_workers=CONTENT_WORKERS) as executor:
+                        full_contents = executor.map(fetch_full_content, [url for _, url in needs_content])
+                        for (i, _), full_content in zip(needs_content, full_contents):
+                            if full_content:
+                                articles[i]['content'] = full_content
+                                logger.info(f"Загружен полный контент ({len(full_content)} символов)")
         
-        for source in sources:
-            if source['id'] not in source_ids:
-                source_ids.add(source['id'])
-                unique_sources.append(source)
+        if args.dry_run:
+            logger.info(f"Dry run: найдено {len(articles)} статей из {source_name}")
         
-        logger.info(f"Получено {len(unique_sources)} источников для обновления")
-        return unique_sources
+        source_result["articles"] = articles
         
     except Exception as e:
-        logger.error(f"Ошибка при получении списка источников: {e}")
-        return []
+        logger.error(f"Ошибка при обработке источника {source_name}: {e}")
+        source_result["error"] = True
+    
+    return source_result
 
 def main():
     """Основная функция для обновления статей"""
@@ -113,7 +244,7 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         
         # Получаем источники для обновления
         sources = get_sources_to_update(db_client, args.all_sources, args.source_id)
@@ -122,107 +253,71 @@ def main():
             logger.warning("Нет источников для обновления")
             return 0
         
-        # Импортируем парсеры здесь, чтобы избежать циклических импортов
-        from src.parsers import get_parser_for_source
-        
         # Статистика
         total_sources = len(sources)
         processed_sources = 0
         total_found = 0
         total_added = 0
         total_skipped = 0
+        total_failed = 0
         error_count = 0
         
-        # Обрабатываем каждый источник
-        for source in sources:
-            source_name = source.get('name', 'Неизвестный источник')
-            logger.info(f"Обработка источника: {source_name}")
+        # Статьи всех источников сохраняются одним пакетом в конце цикла
+        all_articles = []
+        # Проверенные источники и URL их статей: {id источника: (источник, [URL])}
+        fetched_sources = {}
+        # Новые заголовки кэширования лент: {id источника: {etag, last_modified}}
+        feed_headers = {}
+        
+        # Обрабатываем источники параллельно и собираем статистику по мере завершения
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {executor.submit(process_source, source, args, db_client): source for source in sources}
             
-            try:
-                # Получаем подходящий парсер для источника
-                parser = get_parser_for_source(source)
+            for future in as_completed(futures):
+                source_result = future.result()
                 
-                if not parser:
-                    logger.error(f"Не удалось создать парсер для источника {source_name}")
+                if source_result["error"]:
                     error_count += 1
                     continue
                 
-                # Получаем статьи
-                articles = parser.fetch_articles()
-                
-                # Фильтруем статьи по возрасту
-                if args.age > 0 and articles:
-                    cutoff_date = datetime.now() - timedelta(days=args.age)
-                    filtered_articles = []
-                    
-                    for article in articles:
-                        pub_date = article.get('published_at')
-                        if pub_date and isinstance(pub_date, datetime):
-                            # Преобразуем обе даты к timezone-naive формату для корректного сравнения
-                            if pub_date.tzinfo is not None:
-                                # Если дата timezone-aware, конвертируем в timezone-naive
-                                pub_date = pub_date.replace(tzinfo=None)
-                            
-                            if pub_date >= cutoff_date:
-                                filtered_articles.append(article)
-                    
-                    if len(filtered_articles) < len(articles):
-                        logger.info(f"Отфильтровано {len(articles) - len(filtered_articles)} устаревших статей")
-                        articles = filtered_articles
-                
-                # Применяем лимит, если указан
-                if args.limit > 0 and len(articles) > args.limit:
-                    logger.info(f"Применяем лимит в {args.limit} статей (всего найдено: {len(articles)})")
-                    articles = articles[:args.limit]
-                
-                # Сохраняем статистику по количеству статей
-                found_count = len(articles)
-                total_found += found_count
-                
-                logger.info(f"Получено {found_count} статей из {source_name}")
-                
-                # Для каждой статьи загружаем полный контент, если он слишком короткий
-                if not args.dry_run and articles:
-                    for i, article in enumerate(articles):
-                        content = article.get('content', '')
-                        # Если контент слишком короткий, загружаем полный
-                        if len(content) < 500:
-                            url = article.get('url')
-                            if url:
-                                logger.info(f"Загрузка полного контента для статьи: {article.get('title')} (текущая длина: {len(content)})")
-                                full_content = fetch_full_content(url)
-                                if full_content:
-                                    articles[i]['content'] = full_content
-                                    logger.info(f"Загружен полный контент ({len(full_content)} символов)")
-                                # Небольшая пауза между запросами
-                                if i < len(articles) - 1:
-                                    time.sleep(0.5)
-                
-                # Сохраняем статьи, если это не dry-run
-                if not args.dry_run and articles:
-                    result = db_client.save_articles(articles)
-                    added = result.get('added', 0)
-                    skipped = result.get('skipped', 0)
-                    
-                    total_added += added
-                    total_skipped += skipped
-                    
-                    logger.info(f"Результат сохранения для {source_name}: добавлено {added}, пропущено {skipped}")
-                    
-                    # Обновляем время последнего обновления источника
-                    db_client.update_source_last_fetch(source['id'])
-                else:
-                    logger.info(f"Dry run: найдено {found_count} статей из {source_name}")
-                
                 processed_sources += 1
+                total_found += len(source_result["articles"])
+                source = futures[future]
                 
-                # Пауза между источниками для снижения нагрузки
-                if processed_sources < total_sources:
-                    time.sleep(1.0)
+                if source_result["feed_headers"]:
+                    feed_headers[source['id']] = source_result["feed_headers"]
                 
-            except Exception as e:
-                logger.error(f"Ошибка при обработке источника {source_name}: {e}")
-                error_count += 1
+                # Источник проверен, если получены статьи или заголовки ленты
+                # либо лента не изменилась
+                if source_result["articles"] or source_result["feed_headers"] or source_result["not_modified"]:
+                    all_articles.extend(source_result["articles"])
+                    fetched_sources[source['id']] = (
+                        source, [article.get('url') for article in source_result["articles"]]
+                    )
+        
+        # Сохраняем статьи, если это не dry-run
+        if not args.dry_run:
+            failed_urls = set()
+            if all_articles:
+                result = db_client.save_articles_bulk(all_articles)
+                total_added = result.get('added', 0)
+                total_skipped = result.get('skipped', 0)
+                total_failed = result.get('failed', 0)
+                failed_urls = result.get('failed_urls', set())
+            
+            # Время загрузки и новые заголовки ленты сохраняются только для источников,
+            # все статьи которых записаны: иначе следующий условный запрос получит 304
+            # и незаписанные статьи потеряются. Остальные источники будут загружены
+            # заново по прежним заголовкам
+            saved_sources = []
+            for source, urls in fetched_sources.values():
+                if failed_urls.intersection(urls):
+                    logger.warning(f"Статьи источника {source.get('name')} записаны не полностью, "
+                                   f"заголовки ленты не сохраняются")
+                else:
+                    saved_sources.append(source)
+            
+            db_client.save_sources_fetch_state(saved_sources, feed_headers)
         
         # Выводим итоговую статистику
         elapsed_time = time.time() - start_time
@@ -232,12 +327,15 @@ def main():
             f"Найдено {total_found} статей, "
             f"Добавлено {total_added}, "
             f"Пропущено {total_skipped}, "
+            f"Не записано {total_failed}, "
             f"Ошибок {error_count}"
         )
         
     except Exception as e:
         logger.exception(f"Ошибка при выполнении обновления: {e}")
         return 1
+    finally:
+        shutdown_parse_pool()
         
     return 0
 
@@ -5,6 +5,7 @@ import argparse
 from dotenv import load_dotenv
 from loguru import logger
 from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 # Добавляем текущую директорию в путь для импортов
@@ -12,8 +13,15 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger, add_logging_args
-from src.db import SupabaseClient
-from src.parsers import RssParser, HtmlParser
+from src.utils.rate_limit import HostRateLimiter
+from src.db import get_supabase_client
+from src.parsers import create_parser
+
+# Минимальный интервал между запросами к одному сайту, сек
+HOST_DELAY = 1.0
+
+# Количество накопленных статей, после которого они отправляются на сохранение
+SAVE_CHUNK_SIZE = 500
 
 def parse_args():
     """Парсинг аргументов командной строки"""
@@ -43,7 +51,7 @@ def parse_args():
     parser.add_argument(
         '--no-delay', 
         action='store_true', 
-        help='Отключить паузу между запросами к разным источникам'
+        help='Отключить паузу между запросами к одному сайту'
     )
     
     # Добавляем аргументы для логирования
@@ -68,7 +76,7 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         
         # Получаем активные источники
         if args.source_id:
@@ -92,9 +100,43 @@ def main():
             "total_articles": 0,
             "added_articles": 0,
             "skipped_articles": 0,
+            "failed_articles": 0,
             "errors": 0
         }
         
+        # Статьи копятся и сохраняются пакетами в фоновом потоке,
+        # пока основной поток загружает следующие источники
+        all_articles = []
+        # Проверенные источники и URL их статей: {id источника: (источник, [URL])}
+        fetched_sources = {}
+        # Новые заголовки кэширования лент: {id источника: {etag, last_modified}}
+        feed_headers = {}
+        save_pool = ThreadPoolExecutor(max_workers=1)
+        save_futures = []
+        
+        def flush_articles():
+            """Отправка накопленных статей на сохранение в фоновом потоке"""
+            if all_articles:
+                save_futures.append(save_pool.submit(db_client.save_articles_bulk, list(all_articles)))
+                all_articles.clear()
+        
+        # Режим dry-run выбирается один раз, а не проверяется для каждого источника
+        if args.dry_run:
+            def collect_articles(articles, source):
+                """Статьи только учитываются в статистике"""
+                logger.info(f"Dry-run: {len(articles)} статей могли бы быть сохранены")
+        else:
+            def collect_articles(articles, source):
+                """Накопление статей для пакетного сохранения"""
+                all_articles.extend(articles)
+                if source.get('id'):
+                    fetched_sources[source['id']] = (source, [article.get('url') for article in articles])
+                if len(all_articles) >= SAVE_CHUNK_SIZE:
+                    flush_articles()
+        
+        # Пауза выдерживается только между источниками одного сайта
+        host_limiter = HostRateLimiter(0.0 if args.no_delay else HOST_DELAY)
+        
         # Обрабатываем каждый источник
         for source in sources:
             source_id = source.get('id')
@@ -102,18 +144,19 @@ def main():
             logger.info(f"Обработка источника: {source_name}")
             
             try:
-                # Создаем соответствующий парсер
-                parser_type = source.get('parser_type', '').lower()
+                # Получаем соответствующий парсер
+                parser = create_parser(source)
                 
-                if parser_type == 'rss':
-                    parser = RssParser(source)
-                elif parser_type == 'html':
-                    parser = HtmlParser(source)
-                else:
-                    logger.error(f"Неизвестный тип парсера: {parser_type} для источника {source_name}")
+                if not parser:
+                    logger.error(f"Не удалось создать парсер для источника {source_name}")
                     total_stats["errors"] += 1
                     continue
                 
+                # Ждем, если к этому сайту только что был запрос
+                delay = host_limiter.wait(source.get('rss_url') or source.get('url') or '')
+                if delay > 0:
+                    logger.debug(f"Пауза {delay:.2f} сек перед запросом к {source_name}")
+                
                 # Получаем статьи
                 start_time = time.time()
                 articles = parser.fetch_articles()
@@ -126,24 +169,18 @@ def main():
                 
                 logger.info(f"Получено {len(articles)} статей из {source_name} за {end_time - start_time:.2f} сек")
                 
-                # Сохраняем статьи в базу данных, если не включен режим dry-run
-                if articles and not args.dry_run:
-                    stats = db_client.save_articles(articles)
-                    
-                    logger.info(f"Результат сохранения для {source_name}: добавлено {stats['added']}, пропущено {stats['skipped']}")
-                    
-                    # Обновляем общую статистику
-                    total_stats["total_articles"] += len(articles)
-                    total_stats["added_articles"] += stats["added"]
-                    total_stats["skipped_articles"] += stats["skipped"]
-                    
-                    # Обновляем время последней загрузки для источника
-                    if source_id:
-                        db_client.update_source_last_fetch(source_id)
-                elif articles and args.dry_run:
-                    # В режиме dry-run просто обновляем статистику
+                # RSS-парсер отправляет условный запрос: новые заголовки ленты
+                # сохраняются, чтобы следующий запуск получил 304 без тела
+                not_modified = getattr(parser, 'not_modified', False)
+                if not not_modified and (getattr(parser, 'etag', None) or getattr(parser, 'last_modified', None)):
+                    feed_headers[source_id] = {
+                        "etag": parser.etag,
+                        "last_modified": parser.last_modified
+                    }
+                
+                if articles or not_modified or source_id in feed_headers:
                     total_stats["total_articles"] += len(articles)
-                    logger.info(f"Dry-run: {len(articles)} статей могли бы быть сохранены")
+                    collect_articles(articles, source)
                 
                 total_stats["processed_sources"] += 1
                 
@@ -152,11 +189,28 @@ def main():
                 total_stats["errors"] += 1
                 continue
             
-            # Пауза между запросами к разным источникам, если не отключена
-            if not args.no_delay and not source == sources[-1]:
-                delay = 1.0  # секунд
-                logger.debug(f"Пауза {delay} сек перед следующим источником")
-                time.sleep(delay)
+        # Сохраняем остаток статей и дожидаемся всех фоновых сохранений
+        flush_articles()
+        failed_urls = set()
+        for future in save_futures:
+            stats = future.result()
+            total_stats["added_articles"] += stats["added"]
+            total_stats["skipped_articles"] += stats["skipped"]
+            total_stats["failed_articles"] += stats["failed"]
+            failed_urls.update(stats["failed_urls"])
+        save_pool.shutdown()
+        
+        # Время загрузки и новые заголовки ленты сохраняются одним запросом и только
+        # для источников, все статьи которых записаны: иначе следующий условный
+        # запрос получит 304 и незаписанные статьи потеряются
+        saved_sources = []
+        for source, urls in fetched_sources.values():
+            if failed_urls.intersection(urls):
+                logger.warning(f"Статьи источника {source.get('name')} записаны не полностью, "
+                               f"заголовки ленты не сохраняются")
+            else:
+                saved_sources.append(source)
+        db_client.save_sources_fetch_state(saved_sources, feed_headers)
         
         # Выводим итоговую статистику
         logger.success(f"Обработка завершена: "
@@ -164,6 +218,7 @@ def main():
                       f"Найдено {total_stats['total_articles']} статей, "
                       f"Добавлено {total_stats['added_articles']}, "
                       f"Пропущено {total_stats['skipped_articles']}, "
+                      f"Не записано {total_stats['failed_articles']}, "
                       f"Ошибок {total_stats['errors']}")
         
     except Exception as e:
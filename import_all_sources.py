@@ -2,11 +2,12 @@
 # import_all_sources.py
 import os
 import sys
+import re
 import csv
-import time
+import json
+import argparse
 import feedparser
-import requests
-import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from loguru import logger
 from urllib.parse import urlparse
@@ -16,11 +17,118 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
+from src.utils.http_client import create_session
+from src.db import get_supabase_client, execute_with_retry
 
 # Путь к CSV файлу с источниками
 CSV_FILE_PATH = "/Users/maks/Desktop/Content Agent/источники статей.csv"
 
+# Количество источников, проверяемых параллельно
+SOURCE_WORKERS = 32
+
+# Максимальное количество источников в работе одновременно
+MAX_IN_FLIGHT = SOURCE_WORKERS * 2
+
+# Размер пакета при записи источников в базу данных
+INSERT_CHUNK_SIZE = 500
+
+# Общее количество одновременных проверок кандидатов RSS URL,
+# совпадает с размером пула соединений сессии
+PROBE_WORKERS = 64
+
+# Типы содержимого, под которыми отдаются RSS/Atom-ленты
+FEED_CONTENT_TYPE_RE = re.compile(r'rss|xml|atom|feed', re.IGNORECASE)
+
+# Признаки XML-ленты в начале ответа
+FEED_MARKERS = (b'<rss', b'<feed', b'<?xml', b'<rdf')
+
+# Общая сессия с пулом соединений для всех проверок
+SESSION = create_session(pool_connections=32, pool_maxsize=PROBE_WORKERS)
+
+# Общий пул потоков для проверок кандидатов всех источников
+PROBE_EXECUTOR = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+
+# Типовые пути RSS/Atom-лент относительно адреса сайта
+RSS_PATHS = (
+    "/feed", "/feed/", "/rss", "/rss/",
+    "/feed.xml", "/rss.xml", "/atom.xml",
+    "/index.xml", "/feeds/posts/default"
+)
+
+# Дополнительные кандидаты для известных сайтов: {домен: функция(url сайта) -> список URL}
+SPECIAL_RULES = {
+    "techcrunch.com": lambda url: [f"{url}/feed"] if "tag" in url or "category" in url else [],
+    "theverge.com": lambda url: (
+        ["https://www.theverge.com/rss/ai-artificial-intelligence/index.xml"]
+        if "/ai-artificial-intelligence" in url else []
+    ),
+    "artificialintelligence-news.com": lambda url: ["https://www.artificialintelligence-news.com/feed/"],
+    "venturebeat.com": lambda url: [f"{url}/feed"] if "category" in url else [],
+}
+
+# Файл кэша найденных RSS URL
+RSS_URL_CACHE_FILE = '.rss_url_cache.json'
+
+# Кэш найденных RSS: {url сайта: rss url}. Сайты без найденной ленты
+# не кэшируются и проверяются при каждом запуске: лента могла появиться,
+# а сайт мог быть временно недоступен
+RSS_URL_CACHE = {}
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description='Импорт всех источников из CSV файла')
+    parser.add_argument('--refresh-rss', action='store_true',
+                        help='Искать RSS URL заново, игнорируя кэш')
+    return parser.parse_args()
+
+def load_rss_url_cache():
+    """Загрузка кэша RSS URL с диска"""
+    try:
+        with open(RSS_URL_CACHE_FILE, 'r', encoding='utf-8') as f:
+            RSS_URL_CACHE.update((url, rss_url) for url, rss_url in json.load(f).items() if rss_url)
+    except (OSError, ValueError):
+        pass
+
+def save_rss_url_cache():
+    """Сохранение кэша RSS URL на диск"""
+    try:
+        with open(RSS_URL_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(RSS_URL_CACHE, f, ensure_ascii=False, indent=2)
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить кэш RSS URL: {e}")
+
+def probe_rss_url(rss_url):
+    """
+    Проверяет, отдает ли URL валидную RSS/Atom-ленту
+    
+    Args:
+        rss_url: Кандидат RSS URL
+        
+    Returns:
+        bool: True, если по URL доступна непустая лента
+    """
+    try:
+        # Один GET вместо HEAD + повторной загрузки ленты через feedparser
+        with SESSION.get(rss_url, timeout=5, stream=True) as response:
+            if not 200 <= response.status_code < 300:
+                return False
+            
+            if not FEED_CONTENT_TYPE_RE.search(response.headers.get('Content-Type', '')):
+                return False
+            
+            # По первому фрагменту отсеиваем ответы, не похожие на ленту,
+            # не скачивая их целиком
+            chunks = response.iter_content(8192)
+            head = next(chunks, b'')
+            if not any(marker in head.lower() for marker in FEED_MARKERS):
+                return False
+            
+            # Дополнительная проверка с feedparser на уже загруженных данных
+            feed = feedparser.parse(head + b''.join(chunks))
+            return not (feed.bozo and feed.bozo_exception) and len(feed.entries) > 0
+    except Exception:
+        return False
+
 def get_rss_url(site_url):
     """
     Пытается обнаружить RSS URL на основе основного URL сайта
@@ -31,12 +139,6 @@ def get_rss_url(site_url):
     Returns:
         str: Обнаруженный RSS URL или None
     """
-    possible_rss_paths = [
-        "/feed", "/feed/", "/rss", "/rss/", 
-        "/feed.xml", "/rss.xml", "/atom.xml",
-        "/index.xml", "/feeds/posts/default"
-    ]
-    
     # Для .com/blog и подобных адресов
     parsed_url = urlparse(site_url)
     domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
@@ -49,11 +151,11 @@ def get_rss_url(site_url):
     potential_urls = []
     
     # Проверяем URLs на уровне domain + RSS path
-    for rss_path in possible_rss_paths:
+    for rss_path in RSS_PATHS:
         potential_urls.append(f"{domain}{rss_path}")
     
     # Проверяем URLs на уровне полного пути + RSS path
-    for rss_path in possible_rss_paths:
+    for rss_path in RSS_PATHS:
         potential_urls.append(f"{site_url}{rss_path}")
     
     # Если путь содержит подпапки, проверяем RSS для них
@@ -62,51 +164,40 @@ def get_rss_url(site_url):
         for i in range(1, len(path_parts)):
             partial_path = '/'.join(path_parts[:i])
             if partial_path:
-                for rss_path in possible_rss_paths:
+                for rss_path in RSS_PATHS:
                     potential_urls.append(f"{domain}/{partial_path}{rss_path}")
     
     # Специальные случаи для известных сайтов
-    if "techcrunch.com" in site_url:
-        if "tag" in site_url or "category" in site_url:
-            potential_urls.append(f"{site_url}/feed")
-    
-    elif "theverge.com" in site_url:
-        if "/ai-artificial-intelligence" in site_url:
-            potential_urls.append("https://www.theverge.com/rss/ai-artificial-intelligence/index.xml")
-    
-    elif "artificialintelligence-news.com" in site_url:
-        potential_urls.append("https://www.artificialintelligence-news.com/feed/")
-    
-    elif "venturebeat.com" in site_url:
-        if "category" in site_url:
-            potential_urls.append(f"{site_url}/feed")
+    netloc = parsed_url.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    special_rule = SPECIAL_RULES.get(netloc)
+    if special_rule:
+        potential_urls.extend(special_rule(site_url))
     
     # Удаляем дубликаты
     potential_urls = list(set(potential_urls))
     
-    # Проверяем каждый потенциальный URL
-    for rss_url in potential_urls:
-        try:
-            response = requests.head(rss_url, timeout=5)
-            if 200 <= response.status_code < 300:
-                content_type = response.headers.get('Content-Type', '').lower()
-                if any(media_type in content_type for media_type in 
-                      ['rss', 'xml', 'atom', 'feed', 'application/xml', 'text/xml']):
-                    # Дополнительная проверка с feedparser
-                    feed = feedparser.parse(rss_url)
-                    if not (feed.bozo and feed.bozo_exception) and len(feed.entries) > 0:
-                        return rss_url
-        except Exception:
-            continue
+    # Проверяем все потенциальные URL параллельно и берем первый подтвержденный
+    futures = {PROBE_EXECUTOR.submit(probe_rss_url, rss_url): rss_url for rss_url in potential_urls}
+    try:
+        for future in as_completed(futures):
+            if future.result():
+                return futures[future]
+    finally:
+        # Не ждем оставшиеся проверки, если лента уже найдена
+        for future in futures:
+            future.cancel()
     
     return None
 
-def check_source(source):
+def check_source(source, refresh=False):
     """
     Проверяет источник и пытается найти RSS URL
     
     Args:
         source: Словарь с информацией об источнике
+        refresh: Искать RSS URL заново, даже если он есть в кэше
         
     Returns:
         dict: Словарь с обновленной информацией об источнике
@@ -116,8 +207,13 @@ def check_source(source):
         url = source['url']
         logger.info(f"Проверка источника: {name}")
         
-        # Пытаемся обнаружить RSS URL
-        rss_url = get_rss_url(url)
+        # Пытаемся обнаружить RSS URL, при повторных запусках берем его из кэша
+        if not refresh and url in RSS_URL_CACHE:
+            rss_url = RSS_URL_CACHE[url]
+        else:
+            rss_url = get_rss_url(url)
+            if rss_url:
+                RSS_URL_CACHE[url] = rss_url
         
         if rss_url:
             logger.success(f"Найден RSS URL для {name}: {rss_url}")
@@ -135,38 +231,58 @@ def check_source(source):
         logger.error(f"Ошибка при проверке источника {source.get('name', 'Неизвестно')}: {e}")
         return source
 
-def read_sources_from_csv(file_path):
+def iter_sources_from_csv(file_path):
     """
-    Чтение источников из CSV файла
+    Потоковое чтение источников из CSV файла
     
     Args:
         file_path: Путь к CSV файлу
         
-    Returns:
-        list: Список словарей с информацией об источниках
+    Yields:
+        dict: Словарь с информацией об источнике
     """
-    sources = []
     try:
         with open(file_path, 'r', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
             for row in reader:
                 # Создаем словарь для каждого источника
-                source = {
+                yield {
                     'name': row['Название'],
                     'description': row['Краткое описание'],
                     'url': row['Ссылка'],
                     'active': False  # По умолчанию источник неактивен, пока не найдем RSS
                 }
-                sources.append(source)
-                
-        logger.info(f"Загружено {len(sources)} источников из CSV")
-        return sources
     except Exception as e:
         logger.error(f"Ошибка при чтении CSV файла: {e}")
-        return []
+
+def insert_sources(client, rows, stats):
+    """
+    Пакетная вставка источников в базу данных одним upsert
+    
+    Args:
+        client: Клиент Supabase
+        rows: Список источников для вставки
+        stats: Словарь статистики импорта, обновляется на месте
+    """
+    if not rows:
+        return
+    
+    try:
+        # Источники, уже существующие в базе, upsert пропускает и не возвращает
+        response = execute_with_retry(client.table('sources').upsert(
+            rows, on_conflict='name', ignore_duplicates=True
+        ))
+        added = len(response.data or [])
+        stats['added'] += added
+        stats['skipped'] += len(rows) - added
+        logger.success(f"Добавлено источников: {added}")
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении пакета из {len(rows)} источников: {e}")
 
 def main():
     """Основная функция для импорта источников"""
+    args = parse_args()
+    
     # Загружаем переменные окружения из .env файла
     load_dotenv()
     
@@ -174,69 +290,74 @@ def main():
     setup_logger()
     logger.info("Запуск скрипта импорта всех источников")
     
-    # Читаем источники из CSV
-    sources = read_sources_from_csv(CSV_FILE_PATH)
-    if not sources:
-        logger.error("Не удалось загрузить источники из CSV")
+    try:
+        # Инициализируем клиент Supabase
+        db_client = get_supabase_client()
+        client = db_client.client
+    except Exception as e:
+        logger.exception(f"Ошибка при подключении к базе данных: {e}")
         return 1
     
+    if not args.refresh_rss:
+        load_rss_url_cache()
+    
+    stats = {'total': 0, 'rss_found': 0, 'added': 0, 'skipped': 0}
+    pending_rows = []
+    seen_names = set()
+    
+    def collect(source):
+        """Учет проверенного источника и запись накопленного пакета в базу"""
+        stats['total'] += 1
+        if source.get('rss_url'):
+            stats['rss_found'] += 1
+        
+        # Повторы имени внутри CSV отсекаем локально, а уже существующие
+        # в базе источники пропускает сам upsert
+        if source['name'] in seen_names:
+            logger.info(f"Источник '{source['name']}' повторяется в CSV, пропускаем")
+            stats['skipped'] += 1
+            return
+        
+        if source.get('rss_url'):  # Добавляем только источники с RSS
+            seen_names.add(source['name'])
+            pending_rows.append({
+                'name': source['name'],
+                'url': source['url'],
+                'rss_url': source['rss_url'],
+                'parser_type': source['parser_type'],
+                'active': source['active']
+            })
+            
+            if len(pending_rows) >= INSERT_CHUNK_SIZE:
+                insert_sources(client, pending_rows, stats)
+                pending_rows.clear()
+    
     # Проверяем источники и ищем RSS URLs
     logger.info("Проверка источников и поиск RSS URLs...")
     
-    # Используем многопоточность для ускорения проверки
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        updated_sources = list(executor.map(check_source, sources))
-    
-    # Подсчитываем статистику
-    total_sources = len(updated_sources)
-    rss_found = sum(1 for source in updated_sources if source.get('rss_url'))
-    logger.info(f"Всего источников: {total_sources}, Найдены RSS URLs: {rss_found}")
-    
-    # Если RSS URLs найдены, можем импортировать в базу данных
-    if rss_found > 0:
-        try:
-            # Инициализируем клиент Supabase
-            db_client = SupabaseClient()
-            client = db_client.client
-            
-            # Получаем список существующих источников
-            existing_response = client.table('sources').select('name').execute()
-            existing_names = [source['name'] for source in existing_response.data]
-            
-            # Добавляем новые источники
-            added_count = 0
-            skipped_count = 0
-            
-            for source in updated_sources:
-                if source['name'] in existing_names:
-                    logger.info(f"Источник '{source['name']}' уже существует, пропускаем")
-                    skipped_count += 1
-                    continue
-                
-                if source.get('rss_url'):  # Добавляем только источники с RSS
-                    try:
-                        client.table('sources').insert({
-                            'name': source['name'],
-                            'url': source['url'],
-                            'rss_url': source['rss_url'],
-                            'parser_type': source['parser_type'],
-                            'active': source['active']
-                        }).execute()
-                        
-                        logger.success(f"Источник '{source['name']}' успешно добавлен")
-                        added_count += 1
-                        
-                        # Пауза между запросами
-                        time.sleep(0.5)
-                        
-                    except Exception as e:
-                        logger.error(f"Ошибка при добавлении источника '{source['name']}': {e}")
-            
-            logger.success(f"Импорт завершен. Добавлено: {added_count}, Пропущено: {skipped_count}")
-            
-        except Exception as e:
-            logger.exception(f"Ошибка при импорте источников в базу данных: {e}")
-            return 1
+    # Источники читаются из CSV по мере проверки: в работе одновременно
+    # не больше MAX_IN_FLIGHT задач, результаты обрабатываются сразу
+    with ThreadPoolExecutor(max_workers=SOURCE_WORKERS) as executor:
+        in_flight = set()
+        for source in iter_sources_from_csv(CSV_FILE_PATH):
+            in_flight.add(executor.submit(check_source, source, args.refresh_rss))
+            if len(in_flight) >= MAX_IN_FLIGHT:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result())
+        
+        for future in as_completed(in_flight):
+            collect(future.result())
+    
+    insert_sources(client, pending_rows, stats)
+    save_rss_url_cache()
+    
+    if stats['total'] == 0:
+        logger.error("Не удалось загрузить источники из CSV")
+        return 1
+    
+    logger.info(f"Всего источников: {stats['total']}, Найдены RSS URLs: {stats['rss_found']}")
+    logger.success(f"Импорт завершен. Добавлено: {stats['added']}, Пропущено: {stats['skipped']}")
     
     return 0
 
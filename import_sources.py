@@ -3,25 +3,56 @@ import os
 import sys
 import csv
 import json
-import pandas as pd
 from dotenv import load_dotenv
 from loguru import logger
-import time
 import argparse
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Iterator
 
 # Добавляем текущую директорию в путь для импортов
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger, add_logging_args
-from src.db import SupabaseClient
+from src.db import get_supabase_client, execute_with_retry
+
+# orjson разбирает JSON быстрее стандартного модуля, но необязателен;
+# его JSONDecodeError наследуется от json.JSONDecodeError
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 # Обязательные поля для источников
-REQUIRED_FIELDS = ["name", "url", "parser_type"]
+REQUIRED_FIELDS = ("name", "url", "parser_type")
+
+# Значения необязательных колонок для новых источников, если в файле их нет
+SOURCE_DEFAULTS = {
+    "rss_url": None,
+    "selectors": None,
+    "active": True,
+    "fetch_frequency": "1 day",
+    "last_fetch_at": None,
+    "etag": None,
+    "last_modified": None,
+}
+
+# Колонки файла с источниками, которые используются при импорте: все
+# записываемые колонки таблицы sources; id, created_at и updated_at
+# заполняет база данных
+SOURCE_COLUMNS = frozenset(REQUIRED_FIELDS + tuple(SOURCE_DEFAULTS))
 
 # Правильные значения для parser_type
-VALID_PARSER_TYPES = ["rss", "html"]
+VALID_PARSER_TYPES = frozenset({"rss", "html"})
+
+# Строковые значения поля active, которые считаются истиной
+TRUE_STRINGS = frozenset({"true", "1", "yes", "y", "t", "да"})
+
+# Размер пакета имен в одном запросе IN, чтобы не превысить лимит длины URL
+NAME_BATCH_SIZE = 500
+
+# Размер пакета источников в одном запросе записи
+WRITE_BATCH_SIZE = 500
 
 def validate_source(source: Dict[str, Any]) -> List[str]:
     """
@@ -44,7 +75,7 @@ def validate_source(source: Dict[str, Any]) -> List[str]:
     if "parser_type" in source:
         parser_type = source["parser_type"].lower()
         if parser_type not in VALID_PARSER_TYPES:
-            errors.append(f"Некорректный тип парсера: {parser_type}. Допустимые значения: {', '.join(VALID_PARSER_TYPES)}")
+            errors.append(f"Некорректный тип парсера: {parser_type}. Допустимые значения: {', '.join(sorted(VALID_PARSER_TYPES))}")
         
         # Если парсер RSS, проверяем наличие RSS URL
         if parser_type == "rss" and ("rss_url" not in source or not source["rss_url"]):
@@ -75,65 +106,174 @@ def prepare_source(source: Dict[str, Any]) -> Dict[str, Any]:
     # Преобразуем строку с селекторами в JSON объект, если это строка
     if "selectors" in prepared and isinstance(prepared["selectors"], str):
         try:
-            prepared["selectors"] = json.loads(prepared["selectors"])
+            prepared["selectors"] = json_loads(prepared["selectors"])
         except json.JSONDecodeError:
             logger.warning(f"Не удалось преобразовать селекторы в JSON для {prepared.get('name')}: {prepared['selectors']}")
             # Сброс селекторов, если они невалидные
             prepared["selectors"] = {}
     
+    # Значения даты и интервала из Excel приводим к виду, понятному PostgREST
+    for field, value in prepared.items():
+        if isinstance(value, datetime):
+            prepared[field] = value.isoformat()
+        elif isinstance(value, timedelta):
+            prepared[field] = f"{int(value.total_seconds())} seconds"
+    
     # Активен по умолчанию
     if "active" not in prepared:
         prepared["active"] = True
     elif isinstance(prepared["active"], str):
         # Преобразуем строковое значение в булево
-        prepared["active"] = prepared["active"].lower() in ["true", "1", "yes", "y", "да"]
+        prepared["active"] = prepared["active"].lower() in TRUE_STRINGS
     
     return prepared
 
-def read_csv_sources(file_path: str) -> List[Dict[str, Any]]:
+def iter_xlsx_rows(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Потоковое чтение строк первого листа .xlsx файла в режиме read_only
+    
+    В режиме read_only openpyxl не строит модель всей книги в памяти,
+    а из каждой строки берутся только колонки из SOURCE_COLUMNS.
+    
+    Args:
+        file_path: Путь к .xlsx файлу
+    
+    Yields:
+        Dict[str, Any]: Строка в виде словаря
+    """
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [
+            (i, name.strip()) for i, name in enumerate(header)
+            if isinstance(name, str) and name.strip() in SOURCE_COLUMNS
+        ]
+        
+        for row in rows:
+            raw_source = {name: row[i] for i, name in columns if i < len(row)}
+            if any(value is not None for value in raw_source.values()):
+                yield raw_source
+    finally:
+        workbook.close()
+
+def iter_csv_rows(file_path: str) -> Iterator[Dict[str, Any]]:
     """
-    Чтение источников из CSV-файла
+    Потоковое чтение строк CSV-файла
+    
+    Индексы нужных колонок (SOURCE_COLUMNS) вычисляются один раз по
+    заголовку, после чего строка собирается без общих проверок: в CSV
+    все значения - строки, их достаточно очистить от пробелов.
     
     Args:
         file_path: Путь к CSV-файлу
     
-    Returns:
-        List[Dict[str, Any]]: Список источников
+    Yields:
+        Dict[str, Any]: Строка в виде словаря с очищенными значениями
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        # csv.reader быстрее DictReader: словарь строки собираем сами
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = tuple((i, name.strip()) for i, name in enumerate(header) if name.strip() in SOURCE_COLUMNS)
+        
+        for row in reader:
+            if not row:
+                continue
+            if len(row) >= len(header):
+                yield {name: row[i].strip() for i, name in columns}
+            else:
+                # Короткая строка: отсутствующих колонок в словаре нет
+                yield {name: row[i].strip() for i, name in columns if i < len(row)}
+
+def read_csv_sources(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Потоковое чтение источников из CSV/Excel-файла
+    
+    Строки читаются по одной, поэтому ошибки чтения возникают во время
+    итерации, а не при вызове функции.
+    
+    Args:
+        file_path: Путь к CSV-файлу
+    
+    Yields:
+        Dict[str, Any]: Источник без пустых значений и лишних пробелов
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Файл не найден: {file_path}")
     
-    sources = []
-    
     # Определяем расширение файла
     _, ext = os.path.splitext(file_path)
     
-    # Если это Excel файл
-    if ext.lower() in ['.xlsx', '.xls']:
-        try:
-            df = pd.read_excel(file_path)
-            # Преобразуем DataFrame в список словарей
-            raw_sources = df.to_dict(orient='records')
-        except Exception as e:
-            logger.error(f"Ошибка чтения Excel файла: {e}")
-            return []
-    # Иначе считаем, что это CSV
-    else:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                raw_sources = list(reader)
-        except Exception as e:
-            logger.error(f"Ошибка чтения CSV файла: {e}")
-            return []
+    # CSV читается специализированным по заголовку генератором, строки уже очищены
+    if ext.lower() not in ('.xlsx', '.xls'):
+        yield from iter_csv_rows(file_path)
+        return
     
-    # Обрабатываем каждый источник
+    # Если это файл .xlsx, читаем его потоково через openpyxl
+    if ext.lower() == '.xlsx':
+        raw_sources = iter_xlsx_rows(file_path)
+    # Старый формат .xls openpyxl не поддерживает
+    else:
+        # pandas нужен только для .xls, поэтому импортируется здесь
+        import pandas as pd
+        df = pd.read_excel(file_path, usecols=lambda column: str(column).strip() in SOURCE_COLUMNS)
+        df = df.rename(columns=lambda column: str(column).strip())
+        # Пустые ячейки pandas возвращает как NaN; заменяем их на None
+        df = df.astype(object).where(df.notna(), None)
+        # Преобразуем DataFrame в список словарей
+        raw_sources = df.to_dict(orient='records')
+    
+    # В Excel значения бывают разных типов: удаляем пустые и лишние пробелы
     for source in raw_sources:
-        # Удаляем пустые строки и пробелы
-        cleaned_source = {k: v.strip() if isinstance(v, str) else v for k, v in source.items() if v is not None}
-        sources.append(cleaned_source)
+        yield {k: v.strip() if isinstance(v, str) else v for k, v in source.items() if v is not None}
+
+def get_existing_sources(client, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Получение существующих источников по именам пакетными запросами
+    
+    Выбираются только колонки из SOURCE_COLUMNS: ими дополняются строки
+    файла, в которых часть необязательных колонок отсутствует.
+    
+    Args:
+        client: Клиент Supabase
+        names: Список имен источников
+    
+    Returns:
+        Dict[str, Dict[str, Any]]: Соответствие имени источника его записи
+    """
+    existing = {}
+    select_columns = ', '.join(sorted(SOURCE_COLUMNS))
+    for i in range(0, len(names), NAME_BATCH_SIZE):
+        batch = names[i:i + NAME_BATCH_SIZE]
+        response = client.table('sources').select(select_columns).in_('name', batch).execute()
+        for row in response.data:
+            existing[row['name']] = row
+    return existing
+
+def complete_source(source: Dict[str, Any], existing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Приведение источника к полному набору колонок SOURCE_COLUMNS
+    
+    В одном пакетном upsert PostgREST записывает отсутствующие в строке
+    колонки как NULL, поэтому у всех строк пакета должен быть одинаковый
+    набор ключей. Недостающие значения берутся из существующей записи,
+    а для новых источников - из SOURCE_DEFAULTS.
+    
+    Args:
+        source: Подготовленный источник
+        existing: Существующая запись источника или None
     
-    return sources
+    Returns:
+        Dict[str, Any]: Источник со всеми колонками
+    """
+    fallback = existing or SOURCE_DEFAULTS
+    return {
+        column: source[column] if column in source else fallback.get(column)
+        for column in SOURCE_COLUMNS
+    }
 
 def import_sources(file_path: str, dry_run: bool = False, update_existing: bool = True) -> Dict[str, int]:
     """
@@ -152,36 +292,41 @@ def import_sources(file_path: str, dry_run: bool = False, update_existing: bool
         "total": 0,
         "valid": 0,
         "invalid": 0,
+        "duplicates": 0,
         "added": 0,
         "updated": 0,
         "skipped": 0,
         "errors": 0
     }
     
-    # Читаем источники из CSV
+    # Читаем, валидируем и подготавливаем источники в одном проходе по файлу;
+    # повторы имени в файле схлопываем, последняя строка побеждает
+    valid_sources = {}
     try:
-        sources = read_csv_sources(file_path)
-        stats["total"] = len(sources)
-        logger.info(f"Прочитано {len(sources)} источников из файла {file_path}")
+        for source in read_csv_sources(file_path):
+            stats["total"] += 1
+            errors = validate_source(source)
+            
+            if errors:
+                stats["invalid"] += 1
+                logger.warning(f"Невалидный источник {source.get('name', '')}: {', '.join(errors)}")
+                continue
+            
+            prepared_source = prepare_source(source)
+            if prepared_source['name'] in valid_sources:
+                stats["duplicates"] += 1
+                logger.warning(f"Повтор источника {prepared_source['name']} в файле: используется последняя строка")
+            valid_sources[prepared_source['name']] = prepared_source
     except Exception as e:
         logger.error(f"Ошибка чтения файла: {e}")
+        stats["errors"] += 1
         return stats
     
-    # Валидируем и подготавливаем источники
-    valid_sources = []
-    for source in sources:
-        errors = validate_source(source)
-        
-        if errors:
-            stats["invalid"] += 1
-            logger.warning(f"Невалидный источник {source.get('name', '')}: {', '.join(errors)}")
-            continue
-        
-        prepared_source = prepare_source(source)
-        valid_sources.append(prepared_source)
-        stats["valid"] += 1
+    stats["valid"] = len(valid_sources)
     
-    logger.info(f"Валидных источников: {stats['valid']}, невалидных: {stats['invalid']}")
+    logger.info(f"Прочитано {stats['total']} источников из файла {file_path}")
+    logger.info(f"Валидных источников: {stats['valid']}, невалидных: {stats['invalid']}, "
+                f"повторов: {stats['duplicates']}")
     
     # Если режим проверки, не сохраняем источники
     if dry_run:
@@ -190,44 +335,52 @@ def import_sources(file_path: str, dry_run: bool = False, update_existing: bool
     
     # Инициализируем клиент Supabase
     try:
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         client = db_client.client
     except Exception as e:
         logger.error(f"Ошибка подключения к Supabase: {e}")
         stats["errors"] += 1
         return stats
     
-    # Сохраняем источники
-    for source in valid_sources:
+    # Проверяем существование всех источников пакетными запросами
+    try:
+        existing_sources = get_existing_sources(client, list(valid_sources))
+    except Exception as e:
+        logger.error(f"Ошибка при проверке существующих источников: {e}")
+        stats["errors"] += 1
+        return stats
+    
+    # Разделяем источники на новые и существующие
+    to_insert = {}
+    to_update = {}
+    for name, source in valid_sources.items():
+        if name not in existing_sources:
+            to_insert[name] = complete_source(source, None)
+        elif update_existing:
+            to_update[name] = complete_source(source, existing_sources[name])
+        else:
+            logger.info(f"Пропуск существующего источника: {name}")
+            stats["skipped"] += 1
+    
+    # Новые и обновляемые источники записываются одним upsert по имени
+    new_names = set(to_insert)
+    rows = list(to_insert.values()) + list(to_update.values())
+    logger.info(f"Сохранение источников: новых {len(to_insert)}, обновляемых {len(to_update)}")
+    
+    for i in range(0, len(rows), WRITE_BATCH_SIZE):
+        batch = rows[i:i + WRITE_BATCH_SIZE]
         try:
-            # Проверяем, существует ли источник с таким именем
-            check = client.table('sources').select('id, name').eq('name', source['name']).execute()
-            
-            if check.data:
-                # Если источник существует, обновляем его (если включено update_existing)
-                if update_existing:
-                    source_id = check.data[0]['id']
-                    logger.info(f"Обновление источника: {source['name']}")
-                    
-                    client.table('sources').update(source).eq('id', source_id).execute()
-                    stats["updated"] += 1
-                else:
-                    logger.info(f"Пропуск существующего источника: {source['name']}")
-                    stats["skipped"] += 1
-            else:
-                # Иначе добавляем новый
-                logger.info(f"Добавление нового источника: {source['name']}")
-                
-                client.table('sources').insert(source).execute()
-                stats["added"] += 1
-                
-            # Пауза между запросами
-            time.sleep(0.5)
-            
+            execute_with_retry(client.table('sources').upsert(batch, on_conflict='name'))
+            added = sum(1 for source in batch if source['name'] in new_names)
+            stats["added"] += added
+            stats["updated"] += len(batch) - added
         except Exception as e:
-            logger.error(f"Ошибка при сохранении источника {source.get('name', '')}: {e}")
+            logger.error(f"Ошибка при сохранении пакета из {len(batch)} источников: {e}")
             stats["errors"] += 1
-            stats["skipped"] += 1
+            stats["skipped"] += len(batch)
+    
+    # Список активных источников мог измениться
+    db_client.invalidate_sources()
     
     return stats
 
@@ -281,6 +434,7 @@ def main():
                       f"Всего источников: {stats['total']}, "
                       f"Валидных: {stats['valid']}, "
                       f"Невалидных: {stats['invalid']}, "
+                      f"Повторов: {stats['duplicates']}, "
                       f"Добавлено: {stats['added']}, "
                       f"Обновлено: {stats['updated']}, "
                       f"Пропущено: {stats['skipped']}, "
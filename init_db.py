@@ -1,17 +1,15 @@
 # init_db.py
 import os
 import sys
-import json
 from dotenv import load_dotenv
 from loguru import logger
-import time
 
 # Добавляем текущую директорию в путь для импортов
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
+from src.db import get_supabase_client, execute_with_retry
 
 # Пример источников для добавления
 SAMPLE_SOURCES = [
@@ -56,7 +54,7 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         client = db_client.client
         
         # Проверяем существование таблицы sources
@@ -69,25 +67,21 @@ def main():
             logger.info("Пожалуйста, выполните SQL запрос из файла supabase/migrations/20231101000000_create_content_tables.sql в Supabase SQL Editor")
             return 1
         
-        # Добавляем тестовые источники
+        # Добавляем тестовые источники одним запросом; существующие
+        # по имени источники upsert пропускает и не возвращает
         logger.info("Добавление тестовых источников...")
-        for source in SAMPLE_SOURCES:
-            # Проверяем, существует ли источник с таким именем
-            check = client.table('sources').select('id').eq('name', source['name']).execute()
-            
-            if check.data:
-                logger.info(f"Источник {source['name']} уже существует")
-                continue
-                
-            # Добавляем источник
-            try:
-                client.table('sources').insert(source).execute()
-                logger.info(f"Добавлен источник: {source['name']}")
-            except Exception as e:
-                logger.error(f"Ошибка при добавлении источника {source['name']}: {e}")
-            
-            # Пауза между запросами
-            time.sleep(0.5)
+        try:
+            response = execute_with_retry(client.table('sources').upsert(
+                SAMPLE_SOURCES, on_conflict='name', ignore_duplicates=True
+            ))
+            added_names = {source['name'] for source in response.data or []}
+            for source in SAMPLE_SOURCES:
+                if source['name'] in added_names:
+                    logger.info(f"Добавлен источник: {source['name']}")
+                else:
+                    logger.info(f"Источник {source['name']} уже существует")
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении тестовых источников: {e}")
         
         logger.success("Инициализация завершена")
         logger.info("Используйте Supabase SQL Editor для создания таблиц, если они не существуют")
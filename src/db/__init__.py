@@ -1 +1,2 @@
-from .supabase_client import SupabaseClient 
\ No newline at end of file
+# src/db/__init__.py
+from .supabase_client import SupabaseClient, get_supabase_client, execute_with_retry
@@ -1,132 +1,329 @@
 from supabase import create_client, Client
-from typing import Dict, List, Any, Optional
+from supabase.lib.client_options import ClientOptions
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import random
+import threading
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Таймаут запросов к PostgREST по умолчанию, сек: пакетные upsert
+# занимают больше стандартных для postgrest-py 5 секунд
+DEFAULT_POSTGREST_TIMEOUT = 30
+
+# Поля статьи с датами, которые передаются в базу строками ISO
+ARTICLE_DATE_FIELDS = ('published_at', 'created_at')
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Проверка, что запрос отклонен из-за превышения лимита (HTTP 429)"""
+    code = getattr(error, 'code', None)
+    if code is not None and str(code) == '429':
+        return True
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+def execute_with_retry(query, retries: int = 5, base_delay: float = 0.25):
+    """
+    Выполнение запроса с повтором при ответе 429 Too Many Requests
+    
+    Вместо фиксированной паузы перед каждым запросом пауза выдерживается
+    только при реальном ограничении: экспоненциально, со случайной добавкой.
+    
+    Args:
+        query: Построенный запрос postgrest (с методом execute)
+        retries: Максимальное количество повторов
+        base_delay: Базовая пауза перед первым повтором, сек
+        
+    Returns:
+        Ответ запроса
+    """
+    for attempt in range(retries + 1):
+        try:
+            return query.execute()
+        except Exception as e:
+            if attempt == retries or not _is_rate_limited(e):
+                raise
+            delay = base_delay * 2 ** attempt + random.random() * base_delay
+            logger.warning(f"Превышен лимит запросов Supabase, повтор через {delay:.2f} сек")
+            time.sleep(delay)
+
 class SupabaseClient:
     """Клиент для работы с Supabase"""
     
-    def __init__(self, url: str = None, key: str = None):
+    def __init__(self, url: str = None, key: str = None, sources_cache_ttl: float = 60.0,
+                 postgrest_timeout: Optional[float] = None):
         """
         Инициализация клиента Supabase
         
         Args:
             url: URL проекта Supabase
             key: Ключ доступа к API Supabase
+            sources_cache_ttl: Время жизни кэша активных источников, сек (0 - без кэша)
+            postgrest_timeout: Таймаут запросов к PostgREST, сек (по умолчанию из SUPABASE_TIMEOUT)
         """
         self.url = url or os.environ.get('SUPABASE_URL')
         self.key = key or os.environ.get('SUPABASE_KEY')
         
         if not self.url or not self.key:
             raise ValueError("Необходимо указать SUPABASE_URL и SUPABASE_KEY")
-            
-        self.client: Client = create_client(self.url, self.key)
+        
+        if postgrest_timeout is None:
+            postgrest_timeout = float(os.environ.get('SUPABASE_TIMEOUT', DEFAULT_POSTGREST_TIMEOUT))
+        
+        # Все запросы идут через один HTTP-клиент PostgREST с keep-alive
+        # соединениями; клиент создается один раз (см. get_supabase_client)
+        self.client: Client = create_client(
+            self.url, self.key,
+            options=ClientOptions(postgrest_client_timeout=postgrest_timeout)
+        )
         logger.info("Supabase клиент инициализирован")
+        
+        # Кэш активных источников: (время загрузки по time.monotonic, список)
+        self.sources_cache_ttl = sources_cache_ttl
+        self._active_sources_cache: Optional[Tuple[float, List[Dict[str, Any]]]] = None
     
     def get_active_sources(self) -> List[Dict[str, Any]]:
         """
         Получение всех активных источников
         
+        Результат кэшируется на sources_cache_ttl секунд, после записи
+        источников кэш сбрасывается через invalidate_sources().
+        
         Returns:
             List[Dict[str, Any]]: Список активных источников
         """
+        cached = self._active_sources_cache
+        if cached and time.monotonic() - cached[0] < self.sources_cache_ttl:
+            return list(cached[1])
+        
         try:
             response = self.client.table('sources').select('*').eq('active', True).execute()
             
-            if hasattr(response, 'error') and response.error:
-                logger.error(f"Ошибка получения источников: {response.error}")
+            error = getattr(response, 'error', None)
+            if error:
+                logger.error(f"Ошибка получения источников: {error}")
                 return []
             
-            return response.data
+            self._active_sources_cache = (time.monotonic(), response.data)
+            return list(response.data)
         
         except Exception as e:
             logger.error(f"Ошибка при получении активных источников: {e}")
             return []
     
-    def save_articles(self, articles: List[Dict[str, Any]]) -> Dict[str, int]:
+    def invalidate_sources(self):
+        """Сброс кэша активных источников"""
+        self._active_sources_cache = None
+    
+    def save_articles_bulk(self, articles: List[Dict[str, Any]], chunk_size: int = 500,
+                           max_workers: int = 4) -> Dict[str, Any]:
         """
-        Сохранение статей в базу данных
+        Пакетное сохранение статей: один запрос upsert на каждые chunk_size статей
+        
+        Статьи с уже существующим URL пропускаются на стороне базы данных
+        (ON CONFLICT (url) DO NOTHING), поэтому отдельная проверка дубликатов не нужна.
+        Если пакетов несколько, они отправляются параллельно, не более max_workers
+        запросов одновременно. Статьи пакета, который не удалось записать,
+        не считаются пропущенными: их URL возвращаются в failed_urls.
         
         Args:
             articles: Список статей для сохранения
+            chunk_size: Максимальное количество статей в одном запросе
+            max_workers: Максимальное количество одновременных запросов
             
         Returns:
-            Dict[str, int]: Статистика сохранения (добавлено, пропущено)
+            Dict[str, Any]: Статистика сохранения (added, skipped, failed)
+                и множество URL статей, которые не удалось записать (failed_urls)
         """
         if not articles:
-            return {"added": 0, "skipped": 0}
-        
-        stats = {"added": 0, "skipped": 0}
+            return {"added": 0, "skipped": 0, "failed": 0, "failed_urls": set()}
         
-        # Преобразуем datetime объекты в строки ISO для JSON
-        prepared_articles = []
+        # Убираем повторы URL: один INSERT не может дважды попасть в один конфликт
+        unique_articles = {}
         for article in articles:
-            article_copy = article.copy()
-            
-            # Преобразуем даты в строки ISO
-            if article_copy.get('published_at') and isinstance(article_copy['published_at'], datetime):
-                article_copy['published_at'] = article_copy['published_at'].isoformat()
-                
-            if article_copy.get('created_at') and isinstance(article_copy['created_at'], datetime):
-                article_copy['created_at'] = article_copy['created_at'].isoformat()
-                
-            prepared_articles.append(article_copy)
+            url = article.get('url')
+            if url and url not in unique_articles:
+                unique_articles[url] = self._prepare_article(article)
         
-        # Сохраняем каждую статью, игнорируя дубликаты по URL
-        for article in prepared_articles:
-            try:
-                # Проверяем, существует ли статья с таким URL
-                check_response = self.client.table('content_items').select('id').eq('url', article['url']).execute()
-                
-                if hasattr(check_response, 'error') and check_response.error:
-                    logger.error(f"Ошибка проверки дубликата: {check_response.error}")
-                    stats["skipped"] += 1
-                    continue
-                
-                # Если статья уже существует, пропускаем
-                if check_response.data:
-                    logger.debug(f"Статья уже существует: {article['url']}")
-                    stats["skipped"] += 1
-                    continue
-                
-                # Добавляем новую статью
-                insert_response = self.client.table('content_items').insert(article).execute()
-                
-                if hasattr(insert_response, 'error') and insert_response.error:
-                    logger.error(f"Ошибка сохранения статьи: {insert_response.error}")
-                    stats["skipped"] += 1
-                else:
-                    logger.debug(f"Статья сохранена: {article['title']}")
-                    stats["added"] += 1
-                    
-            except Exception as e:
-                logger.error(f"Ошибка при сохранении статьи {article.get('url', '')}: {e}")
-                stats["skipped"] += 1
+        rows = list(unique_articles.values())
+        stats = {"added": 0, "skipped": len(articles) - len(rows), "failed": 0, "failed_urls": set()}
+        chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+        
+        if len(chunks) == 1 or max_workers <= 1:
+            results = map(self._upsert_articles_chunk, chunks)
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                results = list(executor.map(self._upsert_articles_chunk, chunks))
+        
+        for chunk, (added, skipped, ok) in zip(chunks, results):
+            if ok:
+                stats["added"] += added
+                stats["skipped"] += skipped
+            else:
+                stats["failed"] += len(chunk)
+                stats["failed_urls"].update(article['url'] for article in chunk)
         
         return stats
     
-    def update_source_last_fetch(self, source_id: str) -> bool:
+    def _upsert_articles_chunk(self, chunk: List[Dict[str, Any]]) -> Tuple[int, int, bool]:
+        """
+        Отправка одного пакета статей через upsert
+        
+        Args:
+            chunk: Подготовленные статьи пакета
+            
+        Returns:
+            Tuple[int, int, bool]: Количество добавленных и пропущенных статей
+                и признак того, что пакет записан
+        """
+        try:
+            response = execute_with_retry(self.client.table('content_items').upsert(
+                chunk, on_conflict='url', ignore_duplicates=True
+            ))
+            
+            error = getattr(response, 'error', None)
+            if error:
+                logger.error(f"Ошибка пакетного сохранения статей: {error}")
+                return 0, 0, False
+            
+            # В ответе возвращаются только действительно добавленные строки
+            added = len(response.data or [])
+            logger.debug(f"Пакет сохранен: добавлено {added} из {len(chunk)}")
+            return added, len(chunk) - added, True
+            
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном сохранении {len(chunk)} статей: {e}")
+            return 0, 0, False
+    
+    def _prepare_article(self, article: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Обновление времени последней загрузки для источника
+        Подготовка статьи к отправке в базу данных
+        
+        Даты преобразуются на месте, без копирования словаря: статьи
+        от парсеров после сохранения повторно не используются.
         
         Args:
-            source_id: ID источника
+            article: Данные статьи
+            
+        Returns:
+            Dict[str, Any]: Та же статья с датами в формате ISO
+        """
+        # Преобразуем даты в строки ISO
+        for field in ARTICLE_DATE_FIELDS:
+            value = article.get(field)
+            if value.__class__ is datetime:
+                article[field] = value.isoformat()
+        
+        return article
+    
+    def save_sources_fetch_state(self, sources: List[Dict[str, Any]],
+                                 feed_headers: Dict[str, Dict[str, Optional[str]]]) -> bool:
+        """
+        Сохранение результата загрузки источников одним запросом upsert
+        
+        Для каждого источника обновляется last_fetch_at. Источникам из
+        feed_headers записываются новые ETag/Last-Modified ленты, остальным
+        сохраняются прежние. Передавать следует только источники, статьи
+        которых полностью записаны в базу: иначе следующий условный запрос
+        получит 304 и незаписанные статьи больше не будут загружены.
+        
+        Args:
+            sources: Записи источников из таблицы sources
+            feed_headers: Новые заголовки ленты {id источника: {etag, last_modified}}
             
         Returns:
             bool: Успешность операции
         """
+        if not sources:
+            return True
+        
+        now = datetime.now().isoformat()
+        rows = []
+        for source in sources:
+            headers = feed_headers.get(source['id'], source)
+            # Обязательные колонки передаются, чтобы пройти ограничения NOT NULL;
+            # у всех строк одинаковый набор ключей
+            rows.append({
+                "id": source['id'],
+                "name": source['name'],
+                "url": source['url'],
+                "parser_type": source['parser_type'],
+                "last_fetch_at": now,
+                "etag": headers.get('etag'),
+                "last_modified": headers.get('last_modified'),
+            })
+        
         try:
-            self.client.table('sources').update(
-                {"last_fetch_at": datetime.now().isoformat()}
-            ).eq('id', source_id).execute()
+            execute_with_retry(self.client.table('sources').upsert(rows, on_conflict='id'))
+            self.invalidate_sources()
             return True
         except Exception as e:
-            logger.error(f"Ошибка обновления last_fetch_at для источника {source_id}: {e}")
+            logger.error(f"Ошибка сохранения состояния загрузки для {len(rows)} источников: {e}")
             return False
     
+    def update_content_items(self, rows: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+        """
+        Пакетное обновление существующих статей: один запрос upsert на каждые chunk_size статей
+        
+        Каждая строка должна содержать id, а также обязательные поля title и url,
+        чтобы upsert прошел ограничения NOT NULL; остальные колонки статьи
+        не затрагиваются.
+        
+        Args:
+            rows: Обновляемые поля статей
+            chunk_size: Максимальное количество статей в одном запросе
+            
+        Returns:
+            int: Количество обновленных статей
+        """
+        updated = 0
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                response = execute_with_retry(
+                    self.client.table('content_items').upsert(chunk, on_conflict='id')
+                )
+                error = getattr(response, 'error', None)
+                if error:
+                    logger.error(f"Ошибка при пакетном обновлении {len(chunk)} статей: {error}")
+                    continue
+                updated += len(chunk)
+            except Exception as e:
+                logger.error(f"Ошибка при пакетном обновлении {len(chunk)} статей: {e}")
+        
+        return updated
+    
+    def mark_content_checked(self, ids: List[str], checked_at: str, chunk_size: int = 500) -> int:
+        """
+        Отметка попытки загрузить полный текст статей: один запрос update на каждые chunk_size статей
+        
+        Args:
+            ids: ID статей
+            checked_at: Время попытки
+            chunk_size: Максимальное количество ID в одном запросе
+            
+        Returns:
+            int: Количество отмеченных статей
+        """
+        marked = 0
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            try:
+                execute_with_retry(
+                    self.client.table('content_items')
+                    .update({'content_checked_at': checked_at})
+                    .in_('id', chunk)
+                )
+                marked += len(chunk)
+            except Exception as e:
+                logger.error(f"Ошибка при отметке проверки {len(chunk)} статей: {e}")
+        
+        return marked
+    
     def get_content_item_by_url(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Получение статьи по URL
@@ -140,8 +337,9 @@ class SupabaseClient:
         try:
             response = self.client.table('content_items').select('*').eq('url', url).execute()
             
-            if hasattr(response, 'error') and response.error:
-                logger.error(f"Ошибка получения статьи: {response.error}")
+            error = getattr(response, 'error', None)
+            if error:
+                logger.error(f"Ошибка получения статьи: {error}")
                 return None
             
             if not response.data:
@@ -152,29 +350,77 @@ class SupabaseClient:
             logger.error(f"Ошибка при получении статьи по URL {url}: {e}")
             return None
     
+    def get_content_items_by_urls(self, urls: List[str], columns: str = '*',
+                                  chunk_size: int = 100) -> Dict[str, Dict[str, Any]]:
+        """
+        Получение статей по списку URL пакетными запросами
+        
+        URL передаются в строке запроса (IN), поэтому список разбивается
+        на пакеты по chunk_size, чтобы не превысить лимит длины URL.
+        
+        Args:
+            urls: Список URL статей
+            columns: Список колонок для выборки (должен включать url)
+            chunk_size: Максимальное количество URL в одном запросе
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: Найденные статьи по URL
+        """
+        items = {}
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        
+        for start in range(0, len(unique_urls), chunk_size):
+            chunk = unique_urls[start:start + chunk_size]
+            try:
+                response = self.client.table('content_items').select(columns).in_('url', chunk).execute()
+                
+                error = getattr(response, 'error', None)
+                if error:
+                    logger.error(f"Ошибка получения статей по URL: {error}")
+                    continue
+                
+                for item in response.data:
+                    items[item['url']] = item
+            except Exception as e:
+                logger.error(f"Ошибка при получении {len(chunk)} статей по URL: {e}")
+        
+        return items
+    
     def get_content_items(self, 
                           limit: int = 100, 
                           offset: int = 0, 
                           is_translated: bool = None, 
                           is_published: bool = None,
                           language: str = None,
-                          source: str = None) -> List[Dict[str, Any]]:
+                          source: str = None,
+                          columns: str = '*',
+                          cursor: Optional[Tuple[Any, Any]] = None) -> List[Dict[str, Any]]:
         """
         Получение списка статей с фильтрацией
         
+        Статьи упорядочены по (published_at, id) по убыванию, статьи без даты
+        публикации идут первыми (NULL при сортировке по убыванию в PostgreSQL
+        старше любой даты). Для постраничного обхода вместо offset лучше
+        передавать курсор: пару (published_at, id) последней статьи предыдущей
+        страницы. Запрос по курсору не просматривает пропущенные строки, а id
+        различает статьи с одинаковой датой публикации.
+        
         Args:
             limit: Лимит выборки
-            offset: Смещение выборки
+            offset: Смещение выборки (игнорируется, если указан cursor)
             is_translated: Фильтр по переводу
             is_published: Фильтр по публикации
             language: Фильтр по языку
             source: Фильтр по источнику
+            columns: Список выбираемых колонок через запятую
+            cursor: Курсор (published_at, id): вернуть статьи после этой статьи
             
         Returns:
             List[Dict[str, Any]]: Список статей
         """
         try:
-            query = self.client.table('content_items').select('*').order('published_at', desc=True)
+            # Одна строка сортировки дает "published_at.desc,id.desc"
+            query = self.client.table('content_items').select(columns).order('published_at.desc,id', desc=True)
             
             # Применяем фильтры
             if is_translated is not None:
@@ -189,16 +435,97 @@ class SupabaseClient:
             if source:
                 query = query.eq('source', source)
             
-            # Применяем пагинацию
-            query = query.range(offset, offset + limit - 1)
+            # Применяем пагинацию: по курсору, если он передан, иначе по смещению
+            if cursor is not None:
+                published_at, item_id = cursor
+                if published_at is None:
+                    # Курсор среди статей без даты: остальные такие статьи и все датированные
+                    query = query.or_(f'published_at.not.is.null,and(published_at.is.null,id.lt.{item_id})')
+                else:
+                    if isinstance(published_at, datetime):
+                        published_at = published_at.isoformat()
+                    query = query.or_(
+                        f'published_at.lt."{published_at}",'
+                        f'and(published_at.eq."{published_at}",id.lt.{item_id})'
+                    )
+                query = query.limit(limit)
+            else:
+                query = query.range(offset, offset + limit - 1)
             
             response = query.execute()
             
-            if hasattr(response, 'error') and response.error:
-                logger.error(f"Ошибка получения списка статей: {response.error}")
+            error = getattr(response, 'error', None)
+            if error:
+                logger.error(f"Ошибка получения списка статей: {error}")
                 return []
             
             return response.data
         except Exception as e:
             logger.error(f"Ошибка при получении списка статей: {e}")
-            return [] 
\ No newline at end of file
+            return []
+    
+    def iter_content_items(self,
+                           columns: str = '*',
+                           page_size: int = 500,
+                           source: str = None,
+                           order_by: str = 'created_at',
+                           desc: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Постраничная выборка статей без загрузки всего результата в память
+        
+        Следующая страница запрашивается только после обработки текущей,
+        поэтому потребление памяти ограничено размером одной страницы.
+        
+        Args:
+            columns: Список выбираемых колонок через запятую
+            page_size: Размер страницы выборки
+            source: Фильтр по источнику
+            order_by: Поле сортировки
+            desc: Сортировка по убыванию
+            
+        Yields:
+            Dict[str, Any]: Данные статьи
+        """
+        offset = 0
+        
+        while True:
+            query = self.client.table('content_items').select(columns)
+            
+            if source:
+                query = query.eq('source', source)
+            
+            response = query.order(order_by, desc=desc).range(offset, offset + page_size - 1).execute()
+            
+            error = getattr(response, 'error', None)
+            if error:
+                logger.error(f"Ошибка получения страницы статей: {error}")
+                return
+            
+            yield from response.data
+            
+            # Неполная страница означает, что данные закончились
+            if len(response.data) < page_size:
+                return
+            
+            offset += page_size
+
+# Общий экземпляр клиента процесса и блокировка для его создания
+_default_client: Optional[SupabaseClient] = None
+_default_client_lock = threading.Lock()
+
+def get_supabase_client() -> SupabaseClient:
+    """
+    Получение общего клиента Supabase для процесса
+    
+    Клиент создается при первом вызове, дальше все модули используют
+    один и тот же экземпляр и его пул HTTP-соединений с keep-alive.
+    
+    Returns:
+        SupabaseClient: Общий клиент Supabase
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = SupabaseClient()
+    return _default_client
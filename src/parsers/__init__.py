@@ -1,13 +1,73 @@
 # src/parsers/__init__.py
+from .base_parser import BaseParser
 from .rss_parser import RssParser
 from .html_parser import HtmlParser
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
-def get_parser_for_source(source: Dict[str, Any]) -> Optional[RssParser]:
+# Классы парсеров по типу источника
+PARSER_CLASSES = {
+    'rss': RssParser,
+    'html': HtmlParser,
+}
+
+# Кэш созданных парсеров: {ключ конфигурации источника: парсер}
+_parser_cache: Dict[Tuple, BaseParser] = {}
+_parser_cache_lock = threading.Lock()
+
+def _parser_cache_key(source: Dict[str, Any], parser_type: str) -> Tuple:
+    """Ключ кэша из полей источника, влияющих на работу парсера"""
+    selectors = source.get('selectors')
+    return (
+        source.get('id'),
+        parser_type,
+        source.get('url'),
+        source.get('rss_url'),
+        json.dumps(selectors, sort_keys=True) if selectors else None,
+    )
+
+def create_parser(source: Dict[str, Any]) -> Optional[BaseParser]:
+    """
+    Возвращает парсер для источника, переиспользуя ранее созданный
+    
+    Парсер пересоздается только при изменении типа, адресов или селекторов
+    источника. Ошибки создания парсера пробрасываются вызывающему коду.
+    
+    Args:
+        source: Словарь с информацией об источнике
+        
+    Returns:
+        BaseParser: Экземпляр парсера или None для неизвестного типа
+    """
+    parser_type = (source.get('parser_type') or '').lower()
+    parser_class = PARSER_CLASSES.get(parser_type)
+    if parser_class is None:
+        logger.error(f"Неизвестный тип парсера: {parser_type}")
+        return None
+    
+    key = _parser_cache_key(source, parser_type)
+    with _parser_cache_lock:
+        parser = _parser_cache.get(key)
+        if parser is None:
+            parser = parser_class(source)
+            _parser_cache[key] = parser
+        else:
+            # Остальные поля (название, время загрузки) берем из свежей записи
+            parser.source_config = source
+            parser.source_name = source.get('name')
+            # Заголовки ленты для условного запроса тоже из свежей записи:
+            # иначе повторно используемый парсер отправит устаревшие
+            if hasattr(parser, 'etag'):
+                parser.etag = source.get('etag')
+                parser.last_modified = source.get('last_modified')
+    return parser
+
+def get_parser_for_source(source: Dict[str, Any]) -> Optional[BaseParser]:
     """
     Создает и возвращает подходящий парсер для источника
     
@@ -20,15 +80,12 @@ def get_parser_for_source(source: Dict[str, Any]) -> Optional[RssParser]:
     try:
         parser_type = source.get('parser_type', '').lower()
         
-        if parser_type == 'rss':
-            return RssParser(source)
-        elif parser_type == 'html':
+        if parser_type == 'html':
             # В будущем можно добавить поддержку HTML-парсера
             logger.warning(f"HTML-парсер пока не реализован полностью: {source.get('name')}")
             return None
-        else:
-            logger.error(f"Неизвестный тип парсера: {parser_type}")
-            return None
+        
+        return create_parser(source)
     except Exception as e:
         logger.error(f"Ошибка при создании парсера для источника {source.get('name')}: {e}")
-        return None 
\ No newline at end of file
+        return None
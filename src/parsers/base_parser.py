@@ -1,11 +1,85 @@
 # src/parsers/base_parser.py
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+from dateutil.parser import parser as DateParser
 import logging
+import re
+from functools import lru_cache
+from ..utils.http_client import create_session
 
 logger = logging.getLogger(__name__)
 
+# Таймауты HTTP-запросов парсеров: (соединение, чтение), сек
+REQUEST_TIMEOUT = (5, 15)
+
+# Общая для всех парсеров HTTP-сессия: keep-alive соединения переиспользуются
+# между источниками и статьями, временные ошибки сервера повторяются
+HTTP_SESSION = create_session(
+    pool_connections=16,
+    pool_maxsize=32,
+    retries=3,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504)
+)
+
+# Общий экземпляр парсера dateutil, создается один раз при импорте
+_DATE_PARSER = DateParser()
+
+# Последовательности пробельных символов для clean_text:
+# заменяются одним пробелом за один проход
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Даты ISO 8601 разбираются через datetime.fromisoformat без dateutil
+_ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}|$)')
+
+@lru_cache(maxsize=4096)
+def _parse_date(date_str: str) -> Optional[datetime]:
+    """
+    Разбор строки даты в datetime в UTC с кэшированием
+    
+    Записи одной ленты часто содержат одинаковые строки дат, поэтому
+    повторные строки не разбираются заново.
+    
+    Args:
+        date_str: Непустая строка с датой
+        
+    Returns:
+        datetime: Объект datetime с tzinfo=UTC или None
+    """
+    try:
+        parsed = None
+        # Быстрый путь для ISO 8601, самого частого формата в лентах
+        if _ISO_DATE_RE.match(date_str):
+            iso_str = date_str[:-1] + '+00:00' if date_str.endswith('Z') else date_str
+            try:
+                parsed = datetime.fromisoformat(iso_str)
+            except ValueError:
+                parsed = None
+        
+        # Попытка разобрать различные форматы дат
+        if parsed is None:
+            parsed = _DATE_PARSER.parse(date_str)
+        
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc)
+    except Exception as e:
+        logger.warning(f"Ошибка парсинга даты '{date_str}': {e}")
+        return None
+
+def clean_text(text: Optional[str]) -> Optional[str]:
+    """
+    Очистка текста от лишних пробелов и переносов строк
+    
+    Args:
+        text: Исходный текст
+        
+    Returns:
+        str: Очищенный текст или None для пустого текста
+    """
+    return _WHITESPACE_RE.sub(' ', text).strip() if text else None
+
 class BaseParser(ABC):
     """Базовый класс для всех парсеров статей"""
     
@@ -19,6 +93,7 @@ class BaseParser(ABC):
         self.source_config = source_config
         self.source_name = source_config.get('name')
         self.source_url = source_config.get('url')
+        self.session = HTTP_SESSION
     
     @abstractmethod
     def fetch_articles(self) -> List[Dict[str, Any]]:
@@ -32,24 +107,21 @@ class BaseParser(ABC):
     
     def normalize_date(self, date_str: Optional[str]) -> Optional[datetime]:
         """
-        Нормализация строки даты в объект datetime
+        Нормализация строки даты в объект datetime в UTC
+        
+        Даты без часового пояса считаются указанными в UTC, поэтому
+        все парсеры возвращают published_at в одном, сравнимом виде.
         
         Args:
             date_str: Строка с датой
             
         Returns:
-            datetime: Объект datetime или None
+            datetime: Объект datetime с tzinfo=UTC или None
         """
         if not date_str:
             return None
         
-        try:
-            # Попытка разобрать различные форматы дат
-            from dateutil import parser
-            return parser.parse(date_str)
-        except Exception as e:
-            logger.warning(f"Ошибка парсинга даты '{date_str}': {e}")
-            return None
+        return _parse_date(date_str)
     
     def clean_text(self, text: Optional[str]) -> Optional[str]:
         """
@@ -61,7 +133,4 @@ class BaseParser(ABC):
         Returns:
             str: Очищенный текст
         """
-        if not text:
-            return None
-            
-        return ' '.join(text.split()) 
\ No newline at end of file
+        return clean_text(text)
\ No newline at end of file
@@ -1,13 +1,114 @@
 # src/parsers/html_parser.py
-import requests
 from bs4 import BeautifulSoup
-from typing import Dict, List, Any, Optional
+import soupsieve
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import html
 import logging
+import re
+from collections import namedtuple
+from functools import lru_cache
 from datetime import datetime
-from .base_parser import BaseParser
+from .base_parser import BaseParser, REQUEST_TIMEOUT, clean_text
+from ..utils.http_client import fetch_limited, decode_content
 
 logger = logging.getLogger(__name__)
 
+# Количество параллельных загрузок страниц статей
+CONTENT_WORKERS = 8
+
+# Парсер BeautifulSoup для страницы списка статей: быстрый lxml (на C)
+SOUP_PARSER = 'lxml'
+
+# Селекторы, применяемые к страницам статей через lxml без BeautifulSoup
+ARTICLE_SELECTORS = ('content', 'meta_description')
+
+# Скомпилированные селекторы полей элемента списка статей
+ItemSelectors = namedtuple('ItemSelectors', 'url title description date author')
+
+# Стандартный селектор мета-описания, которое можно найти регулярным выражением
+STANDARD_META_DESCRIPTION = 'meta[name=description]'
+
+# Мета-описание ищется регулярным выражением в начале страницы, без разбора HTML
+META_HEAD_BYTES = 64 * 1024
+_META_DESCRIPTION_RE = re.compile(
+    rb'<meta[^>]+name=["\']description["\'][^>]+content=["\']([^"\']+)',
+    re.IGNORECASE
+)
+
+# Стандартное мета-описание в дереве страницы: прямой XPath без разбора CSS,
+# сразу возвращает строку; имя атрибута сравнивается без учета регистра
+_META_DESCRIPTION_XPATH = etree.XPath(
+    'string(//meta[translate(@name, "DESCRIPTION", "description")="description"]/@content)'
+)
+
+@lru_cache(maxsize=256)
+def _compile_selectors(selectors: Tuple[Tuple[str, str], ...]) -> Tuple[Dict[str, Any], ItemSelectors, Dict[str, Any], bool]:
+    """
+    Компиляция селекторов источника
+    
+    Результат кэшируется по набору селекторов и используется только для чтения.
+    
+    Args:
+        selectors: Пары (ключ, CSS селектор), отсортированные по ключу
+        
+    Returns:
+        Tuple: Селекторы страницы списка (soupsieve), селекторы полей элемента,
+            селекторы страницы статьи (lxml) и признак стандартного мета-описания
+    """
+    selectors = dict(selectors)
+    
+    # CSS селекторы страницы списка компилируются один раз, а не при каждом поиске по элементу
+    compiled_selectors = {
+        key: soupsieve.compile(selector)
+        for key, selector in selectors.items()
+        if key not in ARTICLE_SELECTORS
+    }
+    
+    # Селекторы полей элемента собираются в кортеж, а не ищутся в словаре для каждого элемента
+    item_selectors = ItemSelectors(*map(compiled_selectors.get, ItemSelectors._fields))
+    
+    # Страницы статей разбираются lxml напрямую: для них селекторы
+    # компилируются в XPath через cssselect
+    article_selectors = {
+        key: CSSSelector(selectors[key])
+        for key in ARTICLE_SELECTORS
+        if key in selectors
+    }
+    
+    # Стандартное мета-описание извлекается из <head> без построения дерева
+    meta_description = selectors.get('meta_description')
+    meta_description_in_head = (
+        meta_description is not None
+        and re.sub(r'[\s"\']', '', meta_description).lower() == STANDARD_META_DESCRIPTION
+    )
+    
+    return compiled_selectors, item_selectors, article_selectors, meta_description_in_head
+
+def _html_parser(encoding: Optional[str]) -> Optional[lxml.html.HTMLParser]:
+    """
+    Парсер lxml для страницы с кодировкой из заголовка ответа
+    
+    Парсер lxml нельзя использовать из нескольких потоков одновременно,
+    поэтому он создается на каждую страницу.
+    
+    Args:
+        encoding: Кодировка из заголовка Content-Type или None
+        
+    Returns:
+        lxml.html.HTMLParser: Парсер HTML или None для парсера по умолчанию
+    """
+    if not encoding:
+        return None
+    try:
+        return lxml.html.HTMLParser(encoding=encoding)
+    except LookupError:
+        # Неизвестное имя кодировки в заголовке Content-Type
+        return None
+
 class HtmlParser(BaseParser):
     """Парсер для источников с HTML-страницами"""
     
@@ -25,6 +126,18 @@ class HtmlParser(BaseParser):
         for selector in required_selectors:
             if selector not in self.selectors:
                 raise ValueError(f"Отсутствует обязательный селектор '{selector}' для {self.source_name}")
+        
+        # Селекторы компилируются один раз на конфигурацию: парсеры с одинаковыми
+        # селекторами (и пересозданные парсеры того же источника) берут их из кэша
+        (
+            self.compiled_selectors,
+            self.item_selectors,
+            self.article_selectors,
+            self.meta_description_in_head,
+        ) = _compile_selectors(tuple(sorted(
+            (key, selector) for key, selector in self.selectors.items()
+            if selector and isinstance(selector, str)
+        )))
     
     def fetch_articles(self) -> List[Dict[str, Any]]:
         """
@@ -36,34 +149,42 @@ class HtmlParser(BaseParser):
         logger.info(f"Загрузка статей с HTML: {self.source_url}")
         
         try:
-            # Загружаем HTML-страницу
-            response = requests.get(self.source_url, headers={'User-Agent': 'Mozilla/5.0'})
-            response.raise_for_status()
+            # Загружаем HTML-страницу с ограничением размера
+            content, encoding = fetch_limited(self.session, self.source_url, REQUEST_TIMEOUT)
             
-            # Парсим содержимое
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Парсим содержимое: кодировка из заголовка ответа приоритетна, без нее
+            # BeautifulSoup определяет ее по байтам (meta charset, BOM)
+            soup = BeautifulSoup(content, SOUP_PARSER, from_encoding=encoding)
             
             # Находим все элементы списка статей
-            list_selector = self.selectors.get('list_item')
-            items = soup.select(list_selector)
+            items = self.compiled_selectors['list_item'].select(soup)
             
             logger.info(f"Найдено {len(items)} элементов на странице {self.source_url}")
             
             articles = []
+            # Время создания одно на всю загрузку, а не отдельный вызов на каждую статью
+            now = datetime.now()
+            # Одна и та же статья может встречаться несколько раз (например, в разных
+            # рубриках); повторы отбрасываются до загрузки полного контента
+            seen_urls = set()
             
             for item in items:
                 try:
-                    article = self._parse_item(item)
-                    if article:
-                        # Загружаем полное содержимое статьи, если есть селектор контента
-                        if 'content' in self.selectors and article['url']:
-                            self._fetch_article_content(article)
-                        
+                    article = self._parse_item(item, now)
+                    if article and article['url'] not in seen_urls:
+                        seen_urls.add(article['url'])
                         articles.append(article)
                 except Exception as e:
                     logger.error(f"Ошибка обработки элемента из {self.source_name}: {e}")
                     continue
             
+            # Загружаем страницы статей параллельно, только если с них что-то нужно:
+            # контент по селектору или недостающее описание
+            pending = [article for article in articles if self._needs_article_page(article)]
+            if pending:
+                with ThreadPoolExecutor(max_workers=min(CONTENT_WORKERS, len(pending))) as executor:
+                    list(executor.map(self._fetch_article_content, pending))
+            
             logger.info(f"Загружено {len(articles)} статей из {self.source_name}")
             return articles
             
@@ -71,21 +192,23 @@ class HtmlParser(BaseParser):
             logger.error(f"Ошибка загрузки HTML {self.source_url}: {e}")
             return []
     
-    def _parse_item(self, item: BeautifulSoup) -> Optional[Dict[str, Any]]:
+    def _parse_item(self, item: BeautifulSoup, now: datetime) -> Optional[Dict[str, Any]]:
         """
         Парсинг отдельного элемента списка статей
         
         Args:
             item: Элемент BeautifulSoup
+            now: Время загрузки, записываемое в created_at
             
         Returns:
             Dict[str, Any]: Данные статьи
         """
+        url_selector, title_selector, description_selector, date_selector, author_selector = self.item_selectors
+        
         # Извлекаем URL
         url = None
-        url_selector = self.selectors.get('url')
         if url_selector:
-            url_element = item.select_one(url_selector)
+            url_element = url_selector.select_one(item)
             if url_element and url_element.has_attr('href'):
                 url = url_element['href']
                 # Если URL относительный, добавляем базовый URL
@@ -99,9 +222,8 @@ class HtmlParser(BaseParser):
         
         # Извлекаем заголовок
         title = None
-        title_selector = self.selectors.get('title')
         if title_selector:
-            title_element = item.select_one(title_selector)
+            title_element = title_selector.select_one(item)
             if title_element:
                 title = title_element.get_text(strip=True)
         
@@ -111,17 +233,15 @@ class HtmlParser(BaseParser):
         
         # Извлекаем описание (если есть селектор)
         description = None
-        description_selector = self.selectors.get('description')
         if description_selector:
-            desc_element = item.select_one(description_selector)
+            desc_element = description_selector.select_one(item)
             if desc_element:
                 description = desc_element.get_text(strip=True)
         
         # Извлекаем дату публикации (если есть селектор)
         published_at = None
-        date_selector = self.selectors.get('date')
         if date_selector:
-            date_element = item.select_one(date_selector)
+            date_element = date_selector.select_one(item)
             if date_element:
                 date_str = date_element.get_text(strip=True)
                 if date_str:
@@ -129,57 +249,96 @@ class HtmlParser(BaseParser):
         
         # Извлекаем автора (если есть селектор)
         author = None
-        author_selector = self.selectors.get('author')
         if author_selector:
-            author_element = item.select_one(author_selector)
+            author_element = author_selector.select_one(item)
             if author_element:
                 author = author_element.get_text(strip=True)
         
         return {
-            'title': self.clean_text(title),
+            'title': clean_text(title),
             'url': url,
             'published_at': published_at,
             'source': self.source_name,
             'author': author,
-            'description': self.clean_text(description),
+            'description': clean_text(description) if description else None,
             'content': '',  # Контент загрузим отдельно
             'language': 'en',  # По умолчанию английский
             'is_translated': False,
             'is_published': False,
-            'created_at': datetime.now()
+            'created_at': now
         }
     
+    def _needs_article_page(self, article: Dict[str, Any]) -> bool:
+        """
+        Проверка, нужно ли загружать страницу статьи
+        
+        Args:
+            article: Данные статьи
+            
+        Returns:
+            bool: True, если есть селектор контента или нужно мета-описание
+        """
+        return 'content' in self.article_selectors or (
+            'meta_description' in self.article_selectors and not article['description']
+        )
+    
     def _fetch_article_content(self, article: Dict[str, Any]) -> None:
         """
         Загрузка полного содержимого статьи
         
+        Дерево страницы строится только при необходимости: стандартное
+        мета-описание извлекается регулярным выражением из начала страницы,
+        и если селектора контента нет, HTML не разбирается вовсе.
+        
         Args:
             article: Данные статьи
         """
-        content_selector = self.selectors.get('content')
-        if not content_selector:
+        content_selector = self.article_selectors.get('content')
+        meta_desc_selector = self.article_selectors.get('meta_description')
+        needs_description = meta_desc_selector is not None and not article['description']
+        if not content_selector and not needs_description:
             return
             
         try:
-            # Загружаем страницу статьи
-            response = requests.get(article['url'], headers={'User-Agent': 'Mozilla/5.0'})
-            response.raise_for_status()
+            # Загружаем страницу статьи с ограничением размера
+            content, encoding = fetch_limited(self.session, article['url'], REQUEST_TIMEOUT)
+            
+            # Быстрый путь: стандартное мета-описание из начала страницы
+            if needs_description and self.meta_description_in_head:
+                match = _META_DESCRIPTION_RE.search(content[:META_HEAD_BYTES])
+                if match:
+                    description = html.unescape(decode_content(match.group(1), encoding))
+                    article['description'] = clean_text(description)
+                    needs_description = False
             
-            # Парсим содержимое
-            soup = BeautifulSoup(response.text, 'html.parser')
+            if not content_selector and not needs_description:
+                return
+            
+            # Строим дерево lxml без обертки BeautifulSoup: кодировка из заголовка
+            # ответа приоритетна, без нее lxml определяет ее по meta charset
+            tree = lxml.html.fromstring(content, parser=_html_parser(encoding))
             
             # Извлекаем контент
-            content_element = soup.select_one(content_selector)
-            if content_element:
-                # Сохраняем HTML-контент
-                article['content'] = str(content_element)
-                
-                # Если в конфигурации есть селектор краткого описания и оно еще не заполнено
-                meta_desc_selector = self.selectors.get('meta_description')
-                if meta_desc_selector and not article['description']:
-                    meta_desc = soup.select_one(meta_desc_selector)
-                    if meta_desc:
-                        article['description'] = self.clean_text(meta_desc.get_text(strip=True))
+            content_elements = content_selector(tree) if content_selector else None
+            if content_elements:
+                # Сохраняем HTML-контент (без хвостового текста после элемента)
+                article['content'] = etree.tostring(content_elements[0], encoding='unicode', with_tail=False)
+            
+            # Если в конфигурации есть селектор краткого описания и оно еще не заполнено
+            if needs_description and self.meta_description_in_head:
+                description = _META_DESCRIPTION_XPATH(tree)
+                if description:
+                    article['description'] = clean_text(description)
+            elif needs_description:
+                meta_desc = meta_desc_selector(tree)
+                if meta_desc:
+                    element = meta_desc[0]
+                    # У тега <meta> описание хранится в атрибуте content
+                    if element.tag == 'meta':
+                        description = element.get('content', '')
+                    else:
+                        description = element.text_content()
+                    article['description'] = clean_text(description)
         
         except Exception as e:
             logger.error(f"Ошибка загрузки контента статьи {article['url']}: {e}")
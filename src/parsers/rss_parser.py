@@ -2,14 +2,114 @@
 import feedparser
 from typing import Dict, List, Any, Optional
 import logging
-from datetime import datetime
-from .base_parser import BaseParser
-import time
-from newspaper import Article
+from datetime import datetime, timezone
+from .base_parser import BaseParser, REQUEST_TIMEOUT, clean_text
+from ..utils.article_content import fetch_full_content
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
 import requests
 
 logger = logging.getLogger(__name__)
 
+# Количество параллельных загрузок полного контента статей ленты
+CONTENT_WORKERS = 8
+
+# Ленты больше этого размера, байт, разбираются lxml вместо медленного feedparser
+LARGE_FEED_BYTES = 256 * 1024
+
+# Разбор XML ленты: восстановление после ошибок разметки, без сети и внешних сущностей
+_FEED_XML_PARSER = etree.XMLParser(recover=True, huge_tree=False, resolve_entities=False, no_network=True)
+
+# Записи RSS 2.0, RSS 1.0 и Atom независимо от пространства имен
+_FEED_ENTRIES_XPATH = etree.XPath('//*[local-name()="item" or local-name()="entry"]')
+
+# Соответствие локальных имен тегов записи полям записи feedparser,
+# которые читает RssParser._parse_entry
+_FEED_FIELDS = {
+    'title': 'title',
+    'pubDate': 'published',
+    'published': 'published',
+    'issued': 'published',
+    'date': 'published',
+    'updated': 'updated',
+    'modified': 'updated',
+    'author': 'author',
+    'creator': 'author',
+    'description': 'summary',
+    'summary': 'summary',
+    'encoded': 'content',
+    'content': 'content',
+}
+
+def _element_text(element) -> str:
+    """
+    Текст элемента ленты вместе с вложенной разметкой (например, XHTML в Atom)
+    
+    Args:
+        element: Элемент lxml
+        
+    Returns:
+        str: Текст элемента
+    """
+    text = element.text or ''
+    if len(element):
+        text += ''.join(etree.tostring(child, encoding='unicode') for child in element)
+    return text.strip()
+
+def parse_feed_xml(content: bytes) -> Optional[List[Dict[str, Any]]]:
+    """
+    Быстрый разбор записей ленты через lxml
+    
+    Извлекаются только поля, которые использует RssParser._parse_entry,
+    в том же виде, что и у записей feedparser.
+    
+    Args:
+        content: XML ленты
+        
+    Returns:
+        List[Dict[str, Any]]: Записи ленты или None, если записи не найдены
+    """
+    try:
+        root = etree.fromstring(content, parser=_FEED_XML_PARSER)
+    except etree.XMLSyntaxError:
+        return None
+    if root is None:
+        return None
+    
+    entries = []
+    for item in _FEED_ENTRIES_XPATH(root):
+        entry = {}
+        for child in item:
+            if not isinstance(child.tag, str):
+                continue  # комментарии и инструкции обработки
+            name = etree.QName(child).localname
+            
+            if name == 'link':
+                # RSS: адрес в тексте; Atom: в href основной ссылки
+                link = (child.text or '').strip() or (
+                    child.get('href') if child.get('rel', 'alternate') == 'alternate' else None
+                )
+                if link and 'link' not in entry:
+                    entry['link'] = link
+                continue
+            
+            field = _FEED_FIELDS.get(name)
+            if not field or field in entry:
+                continue
+            
+            if field == 'author':
+                # Atom: <author><name>...</name></author>
+                names = [c.text for c in child if isinstance(c.tag, str) and etree.QName(c).localname == 'name']
+                value = (names[0] if names else child.text or '').strip()
+            else:
+                value = _element_text(child)
+            
+            if value:
+                entry[field] = [{'value': value}] if field == 'content' else value
+        entries.append(entry)
+    
+    return entries or None
+
 class RssParser(BaseParser):
     """Парсер для источников с RSS-лентой"""
     
@@ -19,6 +119,12 @@ class RssParser(BaseParser):
         # По умолчанию всегда загружаем полный контент
         self.fetch_full_content = True
         
+        # Заголовки кэширования ленты с прошлой загрузки для условного запроса
+        self.etag = source_config.get('etag')
+        self.last_modified = source_config.get('last_modified')
+        # True, если сервер ответил 304 и лента не изменилась
+        self.not_modified = False
+        
         if not self.rss_url:
             raise ValueError(f"Отсутствует RSS URL для источника {self.source_name}")
     
@@ -32,22 +138,56 @@ class RssParser(BaseParser):
         logger.info(f"Загрузка статей из RSS: {self.rss_url}")
         
         try:
-            feed = feedparser.parse(self.rss_url)
+            # Загружаем ленту через общую сессию условным запросом по ETag/Last-Modified
+            headers = {}
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+            response = self.session.get(self.rss_url, headers=headers, timeout=REQUEST_TIMEOUT)
+            
+            # Лента не изменилась с прошлой загрузки, сервер не прислал тело
+            if response.status_code == 304:
+                logger.info(f"RSS {self.rss_url} не изменился с прошлой загрузки")
+                self.not_modified = True
+                return []
+            response.raise_for_status()
             
-            if feed.bozo and feed.bozo_exception:
-                logger.error(f"Ошибка парсинга RSS {self.rss_url}: {feed.bozo_exception}")
+            self.not_modified = False
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            
+            # Большие ленты разбираются lxml; если записи не нашлись, используем feedparser
+            entries = None
+            if len(response.content) > LARGE_FEED_BYTES:
+                entries = parse_feed_xml(response.content)
+            if entries is None:
+                feed = feedparser.parse(response.content, response_headers=dict(response.headers))
+                if feed.bozo and feed.bozo_exception:
+                    logger.error(f"Ошибка парсинга RSS {self.rss_url}: {feed.bozo_exception}")
+                entries = feed.entries
             
             articles = []
+            # Время создания одно на всю загрузку, а не отдельный вызов на каждую статью
+            now = datetime.now()
+            # Одна и та же статья может встречаться несколько раз (например, в разных
+            # рубриках); повторы отбрасываются до загрузки полного контента
+            seen_urls = set()
             
-            for entry in feed.entries:
+            for entry in entries:
                 try:
-                    article = self._parse_entry(entry)
-                    if article:
+                    article = self._parse_entry(entry, now)
+                    if article and article['url'] not in seen_urls:
+                        seen_urls.add(article['url'])
                         articles.append(article)
                 except Exception as e:
                     logger.error(f"Ошибка обработки записи из {self.source_name}: {e}")
                     continue
             
+            # Полный контент загружается отдельным этапом, параллельно для всех записей
+            if self.fetch_full_content and articles:
+                self._fetch_contents(articles)
+            
             logger.info(f"Загружено {len(articles)} статей из {self.source_name}")
             return articles
         
@@ -55,38 +195,54 @@ class RssParser(BaseParser):
             logger.error(f"Ошибка загрузки RSS {self.rss_url}: {e}")
             return []
     
-    def _fetch_full_content(self, url: str) -> str:
+    def _fetch_contents(self, articles: List[Dict[str, Any]]) -> None:
+        """
+        Параллельная загрузка полного контента статей
+        
+        Статьи загружаются и разбираются общим для всех скриптов извлекателем
+        (см. src.utils.article_content) с единым ограничением частоты запросов
+        к сайту. Ошибка загрузки одной статьи не влияет на остальные: у такой
+        статьи остается контент из ленты.
+        
+        Args:
+            articles: Статьи, собранные из записей ленты
+        """
+        with ThreadPoolExecutor(max_workers=min(CONTENT_WORKERS, len(articles))) as executor:
+            full_contents = executor.map(fetch_full_content, [article['url'] for article in articles])
+            for article, full_content in zip(articles, full_contents):
+                if full_content:
+                    article['content'] = full_content
+    
+    def _entry_date(self, entry: Dict[str, Any]) -> Optional[datetime]:
         """
-        Загрузка полного контента статьи по URL
+        Дата публикации записи в UTC
+        
+        feedparser уже разбирает даты RSS/Atom в struct_time (UTC), поэтому
+        строка разбирается через dateutil, только если feedparser не справился.
         
         Args:
-            url: URL статьи
+            entry: Запись из RSS-ленты
             
         Returns:
-            str: Полный текст статьи
+            datetime: Дата публикации или None
         """
-        try:
-            article = Article(url)
-            article.download()
-            article.parse()
-            
-            if article.text:
-                logger.debug(f"Получен полный контент для статьи {url} ({len(article.text)} символов)")
-                return article.text
-            else:
-                logger.warning(f"Не удалось извлечь текст из статьи {url}")
-                return ""
-                
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке полного контента статьи {url}: {e}")
-            return ""
-            
-    def _parse_entry(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        for field in ('published', 'updated'):
+            parsed = entry.get(f'{field}_parsed')
+            if parsed:
+                return datetime(*parsed[:6], tzinfo=timezone.utc)
+            if entry.get(field):
+                return self.normalize_date(entry.get(field))
+        return None
+    
+    def _parse_entry(self, entry: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
         """
-        Парсинг отдельной записи из RSS
+        Парсинг метаданных отдельной записи из RSS
+        
+        Полный контент статьи здесь не загружается, см. _fetch_contents.
         
         Args:
             entry: Запись из RSS-ленты
+            now: Время загрузки, записываемое в created_at
             
         Returns:
             Dict[str, Any]: Данные статьи
@@ -103,51 +259,29 @@ class RssParser(BaseParser):
             return None
         
         # Обработка даты публикации
-        published_at = None
-        if hasattr(entry, 'published'):
-            published_at = self.normalize_date(entry.published)
-        elif hasattr(entry, 'updated'):
-            published_at = self.normalize_date(entry.updated)
-        
-        # Определение автора
-        author = None
-        if hasattr(entry, 'author'):
-            author = entry.author
-        elif hasattr(entry, 'author_detail') and hasattr(entry.author_detail, 'name'):
-            author = entry.author_detail.name
-        
-        # Содержимое и описание
-        content = ""
-        if hasattr(entry, 'content'):
-            # Некоторые RSS содержат полный контент
-            content = entry.content[0].value if entry.content else ""
-        
-        description = ""
-        if hasattr(entry, 'summary'):
-            description = entry.summary
+        published_at = self._entry_date(entry)
+        
+        # Определение автора; запись читается как словарь, без hasattr
+        author = entry.get('author') or (entry.get('author_detail') or {}).get('name')
+        
+        # Содержимое и описание; некоторые RSS содержат полный контент
+        content = (entry.get('content') or [{}])[0].get('value', '')
+        description = entry.get('summary', '')
         
         # Если контент пустой, используем описание как контент
         if not content and description:
             content = description
-            
-        # Если указано, загружаем полный контент статьи
-        if self.fetch_full_content:
-            full_content = self._fetch_full_content(url)
-            if full_content:
-                content = full_content
-            # Пауза для снижения нагрузки на сервер
-            time.sleep(0.5)
         
         return {
-            'title': self.clean_text(title),
+            'title': clean_text(title),
             'url': url,
             'published_at': published_at,
             'source': self.source_name,
             'author': author,
-            'description': self.clean_text(description),
+            'description': clean_text(description) if description else None,
             'content': content,
             'language': 'en',  # По умолчанию английский
             'is_translated': False,
             'is_published': False,
-            'created_at': datetime.now()
+            'created_at': now
         } 
\ No newline at end of file
@@ -1,2 +1,5 @@
 # src/utils/__init__.py
-from .logger import setup_logger 
\ No newline at end of file
+from .logger import setup_logger
+from .http_client import create_session, fetch_limited, fetch_conditional, decode_content, canonical_url
+from .rate_limit import HostRateLimiter
+from .article_content import fetch_full_content, shutdown_parse_pool
@@ -0,0 +1,182 @@
+# src/utils/article_content.py
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Optional
+
+from .http_client import create_session, fetch_limited, decode_content, canonical_url, DEFAULT_USER_AGENT
+from .rate_limit import HostRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Таймаут загрузки страницы статьи, сек
+REQUEST_TIMEOUT = 15
+
+# Максимальное число параллельных загрузок статей с одного сайта
+MAX_PARALLEL_FETCHES = 16
+
+# Общая keep-alive сессия для загрузки статей: TLS-рукопожатие с сайтом
+# выполняется один раз на соединение, а не на каждую статью. Пул одного
+# хоста рассчитан на все параллельные загрузки. Ошибки соединения и ответы
+# 429/5xx повторяются с экспоненциальной паузой (0.5, 1, 2 сек), заголовок
+# Retry-After учитывается
+SESSION = create_session(
+    pool_connections=32,
+    pool_maxsize=MAX_PARALLEL_FETCHES,
+    retries=3,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504)
+)
+
+# Не более 2 запросов в секунду к одному сайту; ограничитель общий для всех
+# загрузок статей процесса, запросы к разным сайтам не ждут друг друга
+HOST_LIMITER = HostRateLimiter(0.5)
+
+# Пул процессов для разбора страниц newspaper: разбор нагружает процессор
+# и в потоках упирается в GIL. Создается при первой загрузке статьи уже из
+# рабочего потока, поэтому процессы запускаются через spawn: fork при
+# работающих потоках копирует захваченные ими блокировки и может зависнуть
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+# Полные тексты статей по каноническому URL на время работы процесса.
+# Сохраняются только успешные загрузки: после ошибки статья загружается снова
+CONTENT_CACHE_SIZE = 4096
+_content_cache: Dict[str, str] = {}
+_content_cache_lock = threading.Lock()
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Получение общего пула процессов для разбора страниц
+
+    Returns:
+        ProcessPoolExecutor: Пул на все ядра процессора
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+def shutdown_parse_pool():
+    """Остановка пула процессов разбора, если он был создан"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown()
+            _parse_pool = None
+
+@lru_cache(maxsize=None)
+def get_newspaper_config():
+    """
+    Настройки newspaper, создаваемые при первом разборе статьи
+
+    newspaper с зависимостями (nltk, PIL) импортируется тяжело, поэтому
+    загружается лениво: запуск скриптов и ответ на --help от него не зависят.
+    Страница уже загружена, поэтому без загрузки и проверки изображений,
+    без кэша просмотренных статей и без NLP.
+
+    Returns:
+        newspaper.Config: Настройки для Article
+    """
+    from newspaper import Config
+
+    config = Config()
+    config.fetch_images = False
+    config.memoize_articles = False
+    config.request_timeout = REQUEST_TIMEOUT
+    config.browser_user_agent = DEFAULT_USER_AGENT
+    config.number_threads = 1
+    return config
+
+def parse_article_html(url: str, html: str) -> str:
+    """
+    Извлечение текста статьи из HTML с помощью newspaper3k
+
+    Выполняется в процессе пула, поэтому функция объявлена на уровне модуля.
+
+    Args:
+        url: URL статьи
+        html: HTML страницы
+
+    Returns:
+        str: Текст статьи
+    """
+    from newspaper import Article
+
+    article = Article(url, config=get_newspaper_config())
+    article.download(input_html=html)
+    article.parse()
+    return article.text
+
+def extract_text(url: str, content: bytes, encoding: Optional[str]) -> str:
+    """
+    Извлечение текста из загруженной страницы в пуле процессов
+
+    Args:
+        url: URL статьи
+        content: Тело ответа
+        encoding: Кодировка из заголовков ответа
+
+    Returns:
+        str: Текст статьи или пустая строка
+    """
+    # Загрузка идет в потоке, а разбор отправляется в пул процессов
+    text = get_parse_pool().submit(parse_article_html, url, decode_content(content, encoding)).result()
+
+    if text:
+        logger.debug(f"Получен полный контент для статьи {url} ({len(text)} символов)")
+        return text
+    else:
+        logger.warning(f"Не удалось извлечь текст из статьи {url}")
+        return ""
+
+def fetch_full_content(url: str) -> str:
+    """
+    Загрузка полного контента статьи по URL с использованием newspaper3k
+
+    URL приводится к каноническому виду, и непустой результат кэшируется
+    на время работы процесса: варианты одной ссылки загружаются один раз,
+    а неудачная загрузка повторяется при следующем вызове.
+
+    Args:
+        url: URL статьи
+
+    Returns:
+        str: Полный текст статьи или пустая строка
+    """
+    url = canonical_url(url)
+    text = _content_cache.get(url)
+    if text is None:
+        text = _fetch_full_content(url)
+        if text:
+            with _content_cache_lock:
+                if len(_content_cache) < CONTENT_CACHE_SIZE:
+                    _content_cache[url] = text
+    return text
+
+def _fetch_full_content(url: str) -> str:
+    """
+    Загрузка и разбор статьи по каноническому URL
+
+    Args:
+        url: Канонический URL статьи
+
+    Returns:
+        str: Полный текст статьи или пустая строка
+    """
+    try:
+        # Загружаем HTML через общую сессию, newspaper только разбирает страницу
+        HOST_LIMITER.wait(url)
+        content, encoding = fetch_limited(SESSION, url, REQUEST_TIMEOUT)
+        return extract_text(url, content, encoding)
+
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке полного контента статьи {url}: {e}")
+        return ""
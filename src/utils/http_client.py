@@ -0,0 +1,210 @@
+# src/utils/http_client.py
+import logging
+import requests
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# User-Agent по умолчанию для всех HTTP-запросов проекта
+DEFAULT_USER_AGENT = 'Mozilla/5.0'
+
+# Максимальный размер загружаемой страницы, байт; остаток страницы отбрасывается
+MAX_CONTENT_BYTES = 2_000_000
+
+# Размер блока при потоковом чтении ответа, байт
+CHUNK_SIZE = 64 * 1024
+
+def canonical_url(url: str) -> str:
+    """
+    Канонический вид URL статьи: без меток utm_* и фрагмента
+    
+    Варианты одной ссылки из разных рассылок и рубрик приводятся к одному
+    адресу. Путь не меняется: для части сайтов /path и /path/ - разные страницы.
+    
+    Args:
+        url: Исходный URL
+        
+    Returns:
+        str: Канонический URL
+    """
+    parts = urlsplit(url)
+    query = parts.query
+    if 'utm_' in query:
+        query = urlencode([
+            (key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+            if not key.startswith('utm_')
+        ])
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+
+def create_session(pool_connections: int = 32,
+                   pool_maxsize: int = 64,
+                   retries: int = 1,
+                   backoff_factor: float = 0.1,
+                   status_forcelist: Optional[Tuple[int, ...]] = None) -> requests.Session:
+    """
+    Создание HTTP-сессии с пулом соединений
+    
+    Сессия переиспользует TCP/TLS соединения между запросами к одному хосту,
+    поэтому ее следует создавать один раз и передавать во все места загрузки.
+    
+    Args:
+        pool_connections: Количество хостов, для которых хранятся пулы соединений
+        pool_maxsize: Максимальное количество соединений в пуле одного хоста
+        retries: Количество повторов при ошибках соединения
+        backoff_factor: Множитель паузы между повторами
+        status_forcelist: Коды ответа, при которых запрос тоже повторяется
+        
+    Returns:
+        requests.Session: Настроенная сессия
+    """
+    session = requests.Session()
+    session.headers['User-Agent'] = DEFAULT_USER_AGENT
+    
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_forcelist,
+            # Последний ответ с ошибкой возвращается вызывающему коду для raise_for_status
+            raise_on_status=False
+        )
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    return session
+
+
+def fetch_limited(session: requests.Session,
+                  url: str,
+                  timeout,
+                  max_bytes: int = MAX_CONTENT_BYTES) -> Tuple[bytes, Optional[str]]:
+    """
+    Потоковая загрузка страницы с ограничением размера
+    
+    Тело ответа читается блоками и обрезается после max_bytes, поэтому
+    огромная страница не занимает память целиком и не разбирается зря.
+    
+    Args:
+        session: HTTP-сессия
+        url: URL страницы
+        timeout: Таймаут запроса, как в requests
+        max_bytes: Максимальный размер тела ответа, байт
+        
+    Returns:
+        Tuple[bytes, Optional[str]]: Тело ответа и кодировка из заголовков
+        
+    Raises:
+        requests.HTTPError: Если сервер ответил кодом ошибки
+    """
+    with session.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        return _read_limited(response, url, max_bytes), _header_charset(response)
+
+
+def fetch_conditional(session: requests.Session,
+                      url: str,
+                      timeout,
+                      etag: Optional[str] = None,
+                      last_modified: Optional[str] = None,
+                      max_bytes: int = MAX_CONTENT_BYTES) -> Optional[Tuple[bytes, Optional[str], Dict[str, Optional[str]]]]:
+    """
+    Условная потоковая загрузка страницы по ETag/Last-Modified
+    
+    Если страница не изменилась, сервер отвечает 304 без тела.
+    
+    Args:
+        session: HTTP-сессия
+        url: URL страницы
+        timeout: Таймаут запроса, как в requests
+        etag: ETag страницы с прошлой загрузки
+        last_modified: Last-Modified страницы с прошлой загрузки
+        max_bytes: Максимальный размер тела ответа, байт
+        
+    Returns:
+        Tuple: Тело ответа, кодировка и новые заголовки кэширования
+            (etag, last_modified) или None, если страница не изменилась
+        
+    Raises:
+        requests.HTTPError: Если сервер ответил кодом ошибки
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    
+    with session.get(url, timeout=timeout, stream=True, headers=headers) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        return _read_limited(response, url, max_bytes), _header_charset(response), validators
+
+
+def _header_charset(response: requests.Response) -> Optional[str]:
+    """
+    Кодировка, явно указанная в заголовке Content-Type
+    
+    requests подставляет ISO-8859-1 для text/* без charset; такая кодировка
+    не возвращается, чтобы разбор страницы мог определить ее по meta charset.
+    
+    Args:
+        response: Ответ сервера
+        
+    Returns:
+        str: Кодировка из заголовка или None
+    """
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        return None
+    return response.encoding
+
+
+def _read_limited(response: requests.Response, url: str, max_bytes: int) -> bytes:
+    """
+    Чтение тела потокового ответа блоками, не более max_bytes
+    
+    Args:
+        response: Ответ, открытый с stream=True
+        url: URL страницы для сообщения в логе
+        max_bytes: Максимальный размер тела ответа, байт
+        
+    Returns:
+        bytes: Тело ответа, обрезанное до max_bytes
+    """
+    buffer = bytearray()
+    for chunk in response.iter_content(CHUNK_SIZE):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            logger.warning(f"Страница {url} больше {max_bytes} байт, загружено только начало")
+            del buffer[max_bytes:]
+            break
+    
+    return bytes(buffer)
+
+
+def decode_content(content: bytes, encoding: Optional[str]) -> str:
+    """
+    Декодирование тела ответа в строку
+    
+    Args:
+        content: Тело ответа
+        encoding: Кодировка из заголовков ответа или None
+        
+    Returns:
+        str: Текст страницы
+    """
+    try:
+        return content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        # Неизвестное имя кодировки в заголовке Content-Type
+        return content.decode('utf-8', errors='replace')
@@ -6,6 +6,30 @@ from loguru import logger
 import argparse
 from typing import Optional
 
+# Путь к модулю logging; кадры этого файла пропускаются при поиске вызывающего кода
+_LOGGING_FILE = logging.__file__
+
+class InterceptHandler(logging.Handler):
+    """Перенаправление записей стандартного logging в loguru"""
+    
+    def emit(self, record):
+        # Получаем соответствующий уровень loguru
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        
+        # Находим вызывающий код: пропускаем кадры модуля logging
+        frame, depth = logging.currentframe(), 2
+        while frame and frame.f_code.co_filename == _LOGGING_FILE:
+            frame = frame.f_back
+            depth += 1
+        
+        # Сообщение форматируется лениво, только если его примет хотя бы один обработчик
+        logger.opt(depth=depth, exception=record.exc_info, lazy=True).log(
+            level, "{}", record.getMessage
+        )
+
 def setup_logger(log_level: Optional[str] = None, log_file: Optional[str] = None):
     """
     Настройка логирования с использованием loguru
@@ -40,8 +64,12 @@ def setup_logger(log_level: Optional[str] = None, log_file: Optional[str] = None
         colorize=True
     )
     
+    # Подробные трассировки со значениями переменных собираются только при отладке
+    debug = log_level in ('TRACE', 'DEBUG')
+    
     # Добавляем обработчик для записи в файл с ротацией
-    # Ротация происходит при достижении 10 МБ, хранится 5 архивных файлов
+    # Ротация происходит при достижении 10 МБ, хранится 5 архивных файлов.
+    # Запись идет через очередь в фоновом потоке и не блокирует вызывающий код
     logger.add(
         log_file,
         format=file_format,
@@ -49,31 +77,15 @@ def setup_logger(log_level: Optional[str] = None, log_file: Optional[str] = None
         rotation="10 MB",
         compression="zip",
         retention=5,
-        backtrace=True,
-        diagnose=True
+        enqueue=True,
+        backtrace=debug,
+        diagnose=debug
     )
     
-    # Перехватываем логи из стандартного logging
-    class InterceptHandler(logging.Handler):
-        def emit(self, record):
-            # Получаем соответствующий уровень loguru
-            try:
-                level = logger.level(record.levelname).name
-            except ValueError:
-                level = record.levelno
-            
-            # Находим вызывающий код
-            frame, depth = logging.currentframe(), 2
-            while frame.f_code.co_filename == logging.__file__:
-                frame = frame.f_back
-                depth += 1
-            
-            logger.opt(depth=depth, exception=record.exc_info).log(
-                level, record.getMessage()
-            )
-    
-    # Настраиваем перехват для всех стандартных логов
-    logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
+    # Настраиваем перехват для всех стандартных логов; записи ниже уровня
+    # логирования отбрасываются самим logging, еще до создания LogRecord
+    # (номера уровней loguru совпадают с номерами уровней logging)
+    logging.basicConfig(handlers=[InterceptHandler()], level=logger.level(log_level).no, force=True)
     
     # Логируем базовую информацию
     logger.info(f"Логирование настроено: уровень={log_level}, файл={log_file}")
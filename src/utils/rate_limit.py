@@ -0,0 +1,44 @@
+# src/utils/rate_limit.py
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+class HostRateLimiter:
+    """Ограничение частоты запросов к одному хосту, потокобезопасное"""
+    
+    def __init__(self, min_interval: float):
+        """
+        Инициализация ограничителя
+        
+        Args:
+            min_interval: Минимальный интервал между запросами к одному хосту, сек
+        """
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def wait(self, url: str) -> float:
+        """
+        Ожидание, пока к хосту URL можно будет отправить запрос
+        
+        Запросы к разным хостам не ждут друг друга. Очередной слот хоста
+        резервируется под блокировкой, а сама пауза выполняется вне ее.
+        
+        Args:
+            url: URL, к которому будет отправлен запрос
+            
+        Returns:
+            float: Время ожидания в секундах
+        """
+        host = urlparse(url).netloc.lower()
+        
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
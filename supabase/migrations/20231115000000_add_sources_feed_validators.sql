@@ -0,0 +1,3 @@
+-- Заголовки кэширования RSS-ленты для условных запросов (ETag / Last-Modified)
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE sources ADD COLUMN IF NOT EXISTS last_modified TEXT;
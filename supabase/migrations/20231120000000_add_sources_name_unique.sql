@@ -0,0 +1,3 @@
+-- Уникальность имени источника: нужна для пакетного upsert с on_conflict='name'.
+-- Перед применением дубликаты имен в sources должны быть устранены
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sources_name_unique ON sources(name);
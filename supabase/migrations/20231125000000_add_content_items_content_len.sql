@@ -0,0 +1,7 @@
+-- Длина контента статьи, вычисляемая базой: позволяет отбирать статьи
+-- с коротким контентом на сервере, не загружая сам контент
+ALTER TABLE content_items
+    ADD COLUMN IF NOT EXISTS content_len INTEGER
+    GENERATED ALWAYS AS (char_length(coalesce(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_content_items_content_len ON content_items(content_len);
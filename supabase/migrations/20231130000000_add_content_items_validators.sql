@@ -0,0 +1,3 @@
+-- Заголовки кэширования страницы статьи для условных запросов (ETag / Last-Modified)
+ALTER TABLE content_items ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE content_items ADD COLUMN IF NOT EXISTS last_modified TEXT;
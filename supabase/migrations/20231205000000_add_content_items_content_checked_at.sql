@@ -0,0 +1,6 @@
+-- Время последней попытки загрузить полный текст статьи: статьи, которые
+-- уже пробовали обновить, не выбираются повторно при каждом запуске
+ALTER TABLE content_items ADD COLUMN IF NOT EXISTS content_checked_at TIMESTAMP;
+
+-- Постраничная выборка по ключу (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_content_items_created_at_id ON content_items(created_at, id);
@@ -6,18 +6,28 @@
 import os
 import sys
 import argparse
+from datetime import datetime
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import time
 from loguru import logger
-from newspaper import Article
 
 # Добавляем текущую директорию в путь для импортов
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
-from newspaper import Article
+from src.utils.http_client import fetch_conditional, canonical_url
+from src.utils.article_content import (
+    SESSION, HOST_LIMITER, REQUEST_TIMEOUT, MAX_PARALLEL_FETCHES, extract_text, shutdown_parse_pool
+)
+from src.db import get_supabase_client
+
+# Количество статей, загружаемых параллельно
+FETCH_WORKERS = MAX_PARALLEL_FETCHES
+
+# Количество статей в одном запросе к базе при выборке
+PAGE_SIZE = 500
 
 def parse_args():
     """Парсинг аргументов командной строки"""
@@ -30,79 +40,108 @@ def parse_args():
                         help='ID конкретного источника для обновления')
     parser.add_argument('--dry-run', action='store_true',
                         help='Запуск без фактического сохранения в базу данных')
+    parser.add_argument('--recheck', action='store_true',
+                        help='Выбирать и статьи, которые уже пытались обновить')
     parser.add_argument('--log-level', type=str, default='INFO', 
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         help='Уровень логирования (по умолчанию: INFO)')
     
     return parser.parse_args()
 
-def fetch_full_content(url):
+def iter_short_articles(db_client, min_length, source_name=None, page_size=None, recheck=False):
     """
-    Загрузка полного контента статьи по URL с использованием newspaper3k
+    Постраничная выборка статей с коротким контентом в порядке сохранения
+    
+    Длина считается в базе (content_len), сам контент не загружается.
+    Статьи, которые уже пытались обновить (content_checked_at), пропускаются:
+    иначе страницы, которые не загружаются или остаются короткими, выбирались
+    бы при каждом запуске, а до остальных статей очередь не доходила бы.
+    Страницы выбираются по ключу (created_at, id) после последней полученной
+    строки, без OFFSET, поэтому каждая страница стоит одинаково.
     
     Args:
-        url: URL статьи
+        db_client: Клиент базы данных
+        min_length: Длина контента, ниже которой статья выбирается
+        source_name: Название источника для фильтрации
+        page_size: Количество статей в одном запросе
+        recheck: Выбирать и статьи, которые уже пытались обновить
         
-    Returns:
-        str: Полный текст статьи
+    Yields:
+        dict: Статья (id, title, url, content_len, created_at, etag, last_modified)
     """
-    try:
-        article = Article(url)
-        article.download()
-        article.parse()
-        
-        if article.text:
-            logger.debug(f"Получен полный контент для статьи {url} ({len(article.text)} символов)")
-            return article.text
-        else:
-            logger.warning(f"Не удалось извлечь текст из статьи {url}")
-            return ""
-                
-    except Exception as e:
-        logger.error(f"Ошибка при загрузке полного контента статьи {url}: {e}")
-        return ""
+    page_size = page_size or PAGE_SIZE
+    cursor = None
+    
+    while True:
+        query = db_client.client.table('content_items')\
+            .select('id,title,url,content_len,created_at,etag,last_modified')\
+            .lt('content_len', min_length)
+        if not recheck:
+            query = query.is_('content_checked_at', 'null')
+        if source_name:
+            query = query.eq('source', source_name)
+        if cursor:
+            created_at, last_id = cursor
+            query = query.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{last_id})')
+        
+        # Сортировка по двум колонкам в одном параметре order: created_at, затем id
+        rows = query.order('created_at,id').limit(page_size).execute().data
+        yield from rows
+        
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]['created_at'], rows[-1]['id'])
 
-def update_article_content(db_client, article, dry_run=False):
+def update_article_content(article):
     """
-    Обновление контента статьи с загрузкой полного текста
+    Загрузка полного текста статьи без записи в базу данных
+    
+    Страница запрашивается условно по ETag/Last-Modified с прошлой
+    загрузки: неизменившаяся страница не скачивается и не разбирается.
     
     Args:
-        db_client: Клиент базы данных
         article: Данные статьи
-        dry_run: Запуск без фактического сохранения
         
     Returns:
-        tuple: (успех, новая длина контента)
+        dict: Строка для пакетного обновления (id, title, url, content,
+            etag, last_modified) или None
     """
     url = article.get('url')
     if not url:
         logger.error(f"Статья без URL: {article.get('title', 'Без заголовка')}")
-        return False, 0
+        return None
     
     try:
-        # Загружаем полный контент статьи
-        full_content = fetch_full_content(url)
+        # Загружаем полный контент статьи условным запросом
+        HOST_LIMITER.wait(url)
+        response = fetch_conditional(
+            SESSION, canonical_url(url), REQUEST_TIMEOUT,
+            etag=article.get('etag'), last_modified=article.get('last_modified')
+        )
+        if response is None:
+            logger.info(f"Страница статьи не изменилась с прошлой загрузки: {url}")
+            return None
+        
+        content, encoding, validators = response
+        full_content = extract_text(url, content, encoding)
         
         if not full_content:
             logger.warning(f"Не удалось загрузить контент для {url}")
-            return False, 0
-            
-        # Обновляем статью в базе данных
-        if not dry_run:
-            result = db_client.client.table('content_items').update(
-                {"content": full_content}
-            ).eq('id', article['id']).execute()
-            
-            if hasattr(result, 'error') and result.error:
-                logger.error(f"Ошибка обновления статьи: {result.error}")
-                return False, 0
-        
-        logger.info(f"Статья обновлена: {article.get('title', 'Без заголовка')}, новая длина: {len(full_content)}")
-        return True, len(full_content)
+            return None
+        
+        logger.info(f"Загружен контент статьи: {article.get('title', 'Без заголовка')}, новая длина: {len(full_content)}")
+        return {
+            "id": article['id'],
+            "title": article['title'],
+            "url": url,
+            "content": full_content,
+            "etag": validators['etag'],
+            "last_modified": validators['last_modified']
+        }
     
     except Exception as e:
         logger.error(f"Ошибка при обновлении контента статьи {url}: {e}")
-        return False, 0
+        return None
 
 def main():
     """Основная функция для обновления контента статей"""
@@ -121,83 +160,86 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
-        
-        # Формируем запрос для получения статей с коротким контентом
-        query = db_client.client.table('content_items').select('*')
+        db_client = get_supabase_client()
         
         # Если указан source_id, фильтруем по нему
+        source_name = None
         if args.source_id:
             response = db_client.client.table('sources').select('name').eq('id', args.source_id).execute()
             if response.data:
                 source_name = response.data[0].get('name', 'Неизвестный источник')
                 logger.info(f"Обновление статей источника: {source_name} (ID: {args.source_id})")
-                query = query.eq('source', source_name)
             else:
                 logger.error(f"Источник с ID {args.source_id} не найден")
                 return 1
         
-        # Получаем статьи с ограничением по количеству
-        # Сортируем по длине контента (чтобы обновить сначала самые короткие)
-        query = query.order('created_at', desc=True).limit(100)  # Получаем больше, чтобы потом отфильтровать
-        response = query.execute()
-        
-        if not response.data:
-            logger.warning("Не найдено статей для обновления")
-            return 0
-            
-        # Отбираем статьи с коротким контентом
-        articles = response.data
-        filtered_articles = []
-        
-        for article in articles:
-            content = article.get('content', '')
-            if len(content) < args.min_length:
-                filtered_articles.append(article)
-                
-                if len(filtered_articles) >= args.limit:
-                    break
-        
+        # Получаем статьи с ограничением по количеству, постранично
+        filtered_articles = list(islice(
+            iter_short_articles(
+                db_client, args.min_length, source_name,
+                page_size=min(PAGE_SIZE, args.limit), recheck=args.recheck
+            ),
+            args.limit
+        ))
         if not filtered_articles:
             logger.info(f"Не найдено статей с контентом короче {args.min_length} символов")
             return 0
             
         logger.info(f"Найдено {len(filtered_articles)} статей для обновления")
         
-        # Обновляем каждую статью
-        success_count = 0
-        total_old_length = 0
-        total_new_length = 0
-        
+        # Обновляем статьи параллельно: время цикла определяется самыми
+        # медленными загрузками, а не суммой всех запросов
+        old_lengths = {}
         for article in filtered_articles:
-            content = article.get('content', '')
-            title = article.get('title', 'Без заголовка')
-            old_length = len(content)
-            total_old_length += old_length
+            old_length = article.get('content_len') or 0
+            old_lengths[article['id']] = old_length
+            logger.info(f"Обновление статьи: {article.get('title', 'Без заголовка')} (длина контента: {old_length} символов)")
+        
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(filtered_articles))) as executor:
+            rows = [row for row in executor.map(update_article_content, filtered_articles) if row]
+        
+        # Сохраняем весь новый контент пакетным upsert вместо запроса на каждую статью.
+        # Все выбранные статьи отмечаются как проверенные, в том числе не обновленные,
+        # чтобы следующий запуск перешел к другим статьям
+        if not args.dry_run:
+            checked_at = datetime.now().isoformat()
+            for row in rows:
+                row['content_checked_at'] = checked_at
             
-            logger.info(f"Обновление статьи: {title} (длина контента: {old_length} символов)")
+            if rows:
+                updated = db_client.update_content_items(rows)
+                if updated < len(rows):
+                    logger.error(f"Не удалось сохранить {len(rows) - updated} из {len(rows)} статей")
             
-            success, new_length = update_article_content(db_client, article, args.dry_run)
-            
-            if success:
-                success_count += 1
-                total_new_length += new_length
-                
-                if success_count < len(filtered_articles):
-                    # Пауза для снижения нагрузки
-                    time.sleep(1.0)
+            updated_ids = {row['id'] for row in rows}
+            db_client.mark_content_checked(
+                [article['id'] for article in filtered_articles if article['id'] not in updated_ids],
+                checked_at
+            )
+        
+        # Средние длины считаются только по обновленным статьям
+        success_count = 0
+        total_old_length = 0
+        total_new_length = 0
+        for row in rows:
+            success_count += 1
+            total_old_length += old_lengths[row['id']]
+            total_new_length += len(row['content'])
+        count = max(success_count, 1)
         
         # Выводим итоговую статистику
         logger.success(
             f"Обновление завершено: {success_count}/{len(filtered_articles)} статей\n"
-            f"Средняя длина до: {total_old_length / len(filtered_articles):.2f} символов\n"
-            f"Средняя длина после: {total_new_length / len(filtered_articles):.2f} символов\n"
-            f"Увеличение: {(total_new_length - total_old_length) / len(filtered_articles):.2f} символов на статью"
+            f"Средняя длина до: {total_old_length / count:.2f} символов\n"
+            f"Средняя длина после: {total_new_length / count:.2f} символов\n"
+            f"Увеличение: {(total_new_length - total_old_length) / count:.2f} символов на статью"
         )
         
     except Exception as e:
         logger.exception(f"Ошибка при обновлении контента статей: {e}")
         return 1
+    finally:
+        shutdown_parse_pool()
         
     return 0
 
@@ -3,7 +3,6 @@
 import os
 import sys
 from dotenv import load_dotenv
-import time
 from loguru import logger
 
 # Добавляем текущую директорию в путь для импортов
@@ -11,7 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Импортируем модули проекта
 from src.utils.logger import setup_logger
-from src.db import SupabaseClient
+from src.db import get_supabase_client, execute_with_retry
 
 # Обновленные URL для источников
 UPDATED_SOURCES = {
@@ -34,35 +33,45 @@ def main():
     
     try:
         # Инициализируем клиент Supabase
-        db_client = SupabaseClient()
+        db_client = get_supabase_client()
         client = db_client.client
         
-        # Получаем список всех источников
+        # Получаем одним запросом только обновляемые источники и только нужные колонки
         logger.info("Получение списка источников...")
         try:
-            response = client.table('sources').select('*').execute()
+            response = client.table('sources')\
+                .select('id,name,url,parser_type')\
+                .in_('name', list(UPDATED_SOURCES))\
+                .execute()
             sources = response.data
-            logger.info(f"Получено {len(sources)} источников")
+            logger.info(f"Получено {len(sources)} источников для обновления")
         except Exception as e:
             logger.error(f"Ошибка получения списка источников: {e}")
             return 1
         
-        # Обновляем источники с новыми URL
+        # Собираем изменения всех источников и отправляем их одним upsert;
+        # обязательные колонки передаются, чтобы пройти ограничения NOT NULL
+        rows = [
+            {
+                "id": source['id'],
+                "name": source['name'],
+                "url": source['url'],
+                "parser_type": source['parser_type'],
+                **UPDATED_SOURCES[source['name']]
+            }
+            for source in sources
+        ]
+        
         updated_count = 0
-        for source in sources:
-            source_name = source.get('name')
-            if source_name in UPDATED_SOURCES:
-                logger.info(f"Обновление источника: {source_name}")
-                try:
-                    update_data = UPDATED_SOURCES[source_name]
-                    client.table('sources').update(update_data).eq('id', source['id']).execute()
-                    logger.success(f"Источник {source_name} успешно обновлен")
-                    updated_count += 1
-                except Exception as e:
-                    logger.error(f"Ошибка обновления источника {source_name}: {e}")
-                
-                # Пауза между запросами
-                time.sleep(0.5)
+        if rows:
+            logger.info(f"Обновление источников: {', '.join(row['name'] for row in rows)}")
+            try:
+                execute_with_retry(client.table('sources').upsert(rows, on_conflict='id'))
+                updated_count = len(rows)
+                db_client.invalidate_sources()
+                logger.success(f"Источники успешно обновлены: {updated_count}")
+            except Exception as e:
+                logger.error(f"Ошибка обновления источников: {e}")
         
         logger.success(f"Обновление завершено. Обновлено источников: {updated_count}")
         